@@ -16,6 +16,22 @@ def align_and_crop(img: np.ndarray, landmarks: list[list[float]], size: int = 11
     M, _ = cv2.estimateAffinePartial2D(pts, ref * (size / 112.0))
     return cv2.warpAffine(img, M, (size, size), flags=cv2.INTER_LINEAR)
 
+def detections_to_arrays(results):
+    """
+    Boxes (N, 4) and landmarks (N, 5, 2) from compact or per-detection SCRFD
+    results; detections without all 5 landmarks are skipped.
+    """
+    if results and "boxes" in results[0]:
+        boxes, lms = results[0]["boxes"], results[0]["landmarks"]
+        if lms.shape[1] != 5:  # model without landmark outputs
+            return boxes[:0], np.empty((0, 5, 2), np.float32)
+        return boxes, lms
+    dets = [d for d in results if len(d.get("landmarks", [])) == 5]
+    boxes = np.array([d["bbox"] for d in dets], dtype=np.float32).reshape(-1, 4)
+    lms = np.array([[lm["landmark"] for lm in d["landmarks"]] for d in dets],
+                   dtype=np.float32).reshape(-1, 5, 2)
+    return boxes, lms
+
 def main():
     # Load models
     face_det = dg.load_model(
@@ -46,18 +62,19 @@ def main():
     try:
         while True:
             frame = picam2.capture_array()
-            dets = face_det(frame).results
-
-            for face in dets:
-                x1, y1, x2, y2 = map(int, face["bbox"])
-                landmarks = [lm["landmark"] for lm in face["landmarks"]]
+            boxes, landmarks = detections_to_arrays(face_det(frame).results)
+            boxes = boxes.astype(int).tolist()
+            crops = [align_and_crop(frame, pts, size=112) for pts in landmarks]
 
-                # Align & embed
-                crop = align_and_crop(frame, landmarks, size=112)
-                emb = face_rec(crop).results[0]["data"][0]
+            # Embed all faces in one batch, then cosine similarity in one step
+            if crops:
+                embs = np.array([r.results[0]["data"][0] for r in face_rec.predict_batch(crops)],
+                                dtype=np.float32)
+                sims = (embs @ ref_emb) / (np.linalg.norm(embs, axis=1) * np.linalg.norm(ref_emb))
+            else:
+                sims = []
 
-                # Cosine similarity
-                sim = np.dot(emb, ref_emb) / (np.linalg.norm(emb)*np.linalg.norm(ref_emb))
+            for (x1, y1, x2, y2), sim in zip(boxes, sims):
                 name = "Furkan" if sim > threshold else "Unknown"
 
                 # Draw
@@ -1,88 +1,113 @@
 #!/usr/bin/env python3
-import queue
-import time
 import sys
 
 from config import (
     UNKNOWN_COOLDOWN,
     ULTRASONIC_THRESHOLD_CM,
     ULTRASONIC_HOLD_TIME_S,
+    METRICS_ENABLED,
 )
-from camera import CameraThread
+from events import EventQueue, EVT_COMMAND, EVT_RECOGNITION, EVT_ULTRASONIC, EVT_AUTO_CLOSE, EVT_DOOR
 from recognizer import RecognizerThread
 from ws_client import WSClientThread
 from ultrasonic import UltrasonicThread
-from door_controller import DoorController
+from door_controller import DoorController, OPEN, CLOSED
+from hal import create_camera, get_gpio
 from notifier import notify_unknown_face
+from metrics import start_metrics_server
 
 def main():
-    # Queues for WS/ultrasonic commands and recognition events
-    cmd_q = queue.Queue()
-    evt_q = queue.Queue()
+    # One event source for WS commands, recognition events, sensor changes and timers
+    events = EventQueue()
 
     # Initialize threads and controller
-    cam_thread        = CameraThread()
-    recog_thread      = RecognizerThread(cam_thread, evt_q)
-    ws_thread         = WSClientThread(cmd_q)
-    ultrasonic_thread = UltrasonicThread(cmd_q)
-    door_ctrl         = DoorController()
+    cam_thread        = create_camera()
+    recog_thread      = RecognizerThread(cam_thread, events.channel(EVT_RECOGNITION))
+    ws_thread         = WSClientThread(events.channel(EVT_COMMAND))
+    ultrasonic_thread = UltrasonicThread(events.channel(EVT_ULTRASONIC), gpio=get_gpio())
+    door_ctrl         = DoorController(gpio=get_gpio())
+    # door motion runs on its own thread; completed moves come back as events
+    door_ctrl.add_listener(lambda old, new: events.post(EVT_DOOR, (old, new)))
+
+    # Local Prometheus endpoint with pipeline latencies and counters
+    if METRICS_ENABLED:
+        start_metrics_server()
 
     # Start all threads
     cam_thread.start()
     recog_thread.start()
     ws_thread.start()
     ultrasonic_thread.start()
+    door_ctrl.start()
 
-    last_unknown       = 0.0
+    last_unknown       = None
+    auto_close         = None   # pending EVT_AUTO_CLOSE timer while something is near
 
     try:
         while True:
-            now = time.time()
+            # sleep until something happens or a timer falls due
+            evt = events.get()
 
-            # read most recent distance measurement
-            dist = getattr(ultrasonic_thread, "last_distance", None)
-            print(f"[MAIN] Ultrasonic distance: {dist}")
+            # 1) Sensor state changes: auto-close once an object has been under
+            #    the threshold for ULTRASONIC_HOLD_TIME_S
+            if evt.kind == EVT_ULTRASONIC:
+                state, dist = evt.data
+                print(f"[MAIN] Ultrasonic {state} (distance={dist})")
+                if state == "near":
+                    if auto_close is None:
+                        auto_close = events.call_later(ULTRASONIC_HOLD_TIME_S, EVT_AUTO_CLOSE)
+                elif auto_close is not None:
+                    auto_close.cancel()
+                    auto_close = None
 
-            # 2) If object has been under threshold for ULTRASONIC_HOLD_TIME_S, auto-close
-            if ultrasonic_thread.should_auto_close():
-                closed = door_ctrl.close()
-                if closed:
-                    ws_thread.send_closed_status()
-                ultrasonic_thread.reset_auto_close()
+            elif evt.kind == EVT_AUTO_CLOSE:
+                door_ctrl.close()
+                # still blocked: check again after another hold period
+                auto_close = events.call_later(ULTRASONIC_HOLD_TIME_S, EVT_AUTO_CLOSE)
 
-            # 1) Handle OPEN/CLOSED commands from WS (manual), but only allow CLOSE if dist > threshold is ignored
-            while not cmd_q.empty():
-                cmd = cmd_q.get()
+            # 2) Handle OPEN/CLOSED commands from WS (manual), but only allow CLOSE if dist > threshold is ignored
+            elif evt.kind == EVT_COMMAND:
+                cmd = evt.data
                 if cmd == "OPEN":
-                    if door_ctrl.open():
-                        ws_thread.send_opened_status()
-                        ultrasonic_thread.door_is_open = True
+                    door_ctrl.open()
                 elif cmd == "CLOSED":
                     # Only ignore CLOSE if distance is greater than threshold
+                    dist = ultrasonic_thread.last_distance
                     if dist is not None and dist > ULTRASONIC_THRESHOLD_CM:
                         print(f"[MAIN] Ignored CLOSE command (distance={dist})")
                         ws_thread.send_closed_status()  # Send CLOSED via websocket if ignored
                     else:
-                        if door_ctrl.close():
-                            ws_thread.send_closed_status()
-                            ultrasonic_thread.door_is_open = False
+                        door_ctrl.close()
 
             # 3) Handle recognition events (immediate open on recognized)
-            while not evt_q.empty():
-                evt = evt_q.get()
-                if evt[0] == "recognized":
-                    if door_ctrl.open():
-                        ultrasonic_thread.door_is_open = True
-                        pass
-                elif evt[0] == "unknown":
-                    _, emb, frame = evt
-                    if now - last_unknown >= UNKNOWN_COOLDOWN:
-                        notify_unknown_face(frame, emb)
-                        last_unknown = now
+            #    (the trace is extended from the recognizer hand-off to the door command)
+            elif evt.kind == EVT_RECOGNITION:
+                trace = evt.data[-1]
+                trace.mark("handoff")
+                if evt.data[0] == "recognized":
+                    # False if the door was already opening or open
+                    opened = door_ctrl.open()
+                    trace.mark("door_command")
+                    trace.finish("door_open" if opened else "recognized", event=True)
+                elif evt.data[0] == "unknown":
+                    _, emb, frame, box, face, _ = evt.data
+                    if last_unknown is None or evt.time - last_unknown >= UNKNOWN_COOLDOWN:
+                        notify_unknown_face(frame, emb, box, face)
+                        last_unknown = evt.time
+                        trace.mark("notify")
+                    trace.finish("unknown", event=True)
 
-            # no inactivity auto-close; sensor logic covers closing
+            # 4) Door reached a position: report it over the websocket
+            elif evt.kind == EVT_DOOR:
+                _, state = evt.data
+                if state == OPEN:
+                    ws_thread.send_opened_status()
+                    ultrasonic_thread.door_is_open = True
+                elif state == CLOSED:
+                    ws_thread.send_closed_status()
+                    ultrasonic_thread.door_is_open = False
 
-            time.sleep(0.01)
+            # no inactivity auto-close; sensor logic covers closing
 
     except KeyboardInterrupt:
         print("Exiting…")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# benchmark.py
+"""
+Microbenchmarks for the recognition hot path, runnable off the Pi:
+- SCRFD and ArcFace-dequantize postprocessors on synthetic quantized tensors
+  (the real PythonFile postprocessors, loaded as in replay_models)
+- detections_to_arrays, detection_quality and align_and_crop (detection-size
+  and full-resolution source frames)
+- gallery matching against 10 .. 100k identities
+
+Each benchmark reports per-call latency percentiles and the peak memory
+allocated per call (tracemalloc, measured in a separate pass so tracing does
+not distort the timings).
+
+Usage:
+  python benchmark.py --save baseline.json        # record a baseline
+  python benchmark.py --compare baseline.json     # flag regressions (exit 1)
+  python benchmark.py --only gallery --quick
+"""
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from functools import partial
+from typing import Callable
+import cv2
+import numpy as np
+
+from config import FACE_DET_MODEL, FACE_REC_MODEL, ZOO_URL
+from gallery import GalleryIndex
+from quality import detection_quality
+from replay_models import load_postprocessor, synthetic_recording
+from utils import align_and_crop, detections_to_arrays
+
+GALLERY_SIZES = (10, 1000, 10000, 100000)
+EMBEDDING_DIM = 512
+DEFAULT_THRESHOLD = 0.15     # relative p50 change reported as a regression
+
+# 5-point template of a ~150 px face, shifted and rotated per sample
+_FACE = np.array([[-30, -20], [30, -20], [0, 10], [-25, 40], [25, 40]], dtype=np.float32)
+
+
+def random_landmarks(rng: np.random.Generator, n: int, size: int = 640) -> np.ndarray:
+    """(n, 5, 2) plausible landmark sets inside a size x size frame."""
+    angles = rng.uniform(-0.3, 0.3, n)
+    scales = rng.uniform(0.5, 1.5, n)
+    centers = rng.uniform(100, size - 100, (n, 2))
+    c, s = np.cos(angles), np.sin(angles)
+    rot = np.stack([np.stack([c, -s], -1), np.stack([s, c], -1)], -2) * scales[:, None, None]
+    return (np.einsum("nij,kj->nki", rot, _FACE) + centers[:, None, :]).astype(np.float32)
+
+
+def _scrfd_setup():
+    scrfd = load_postprocessor(FACE_DET_MODEL, ZOO_URL)
+    tensors, details = synthetic_recording(FACE_DET_MODEL, ZOO_URL, faces=4,
+                                           rng=np.random.default_rng(0))
+    return scrfd, tensors, details
+
+
+def _scrfd_forward() -> Callable:
+    scrfd, tensors, details = _scrfd_setup()
+    return lambda: scrfd.forward(tensors, details)
+
+
+def _detections_to_arrays() -> Callable:
+    scrfd, tensors, details = _scrfd_setup()
+    dets = scrfd.forward(tensors, details)
+    return lambda: detections_to_arrays(dets)
+
+
+def _dequantize_forward() -> Callable:
+    deq = load_postprocessor(FACE_REC_MODEL, ZOO_URL)
+    tensors, details = synthetic_recording(FACE_REC_MODEL, ZOO_URL, rng=np.random.default_rng(0))
+    return lambda: deq.forward(tensors, details)
+
+
+def _faces(n: int = 64):
+    """A detection-size frame with n landmark sets, their boxes and scores."""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (640, 640, 3), dtype=np.uint8)
+    lms = random_landmarks(rng, n)
+    boxes = np.concatenate([lms.min(1) - 20, lms.max(1) + 20], axis=1)
+    scores = rng.uniform(0.5, 1.0, n).astype(np.float32)
+    return frame, lms, boxes, scores
+
+
+def _align_and_crop(hires: bool) -> Callable:
+    frame, lms, _, _ = _faces()
+    if hires:
+        frame, lms = cv2.resize(frame, (1280, 1280)), lms * 2
+    it = itertools.count()
+    return lambda: align_and_crop(frame, lms[next(it) % len(lms)])
+
+
+def _detection_quality() -> Callable:
+    _, lms, boxes, scores = _faces(8)
+    return lambda: detection_quality(boxes, scores, lms)
+
+
+def _gallery_match(n: int, probes: int) -> Callable:
+    rng = np.random.default_rng(n)
+    gallery = GalleryIndex()
+    gallery.replace([f"id{i}" for i in range(n)],
+                    rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32))
+    p = rng.standard_normal((probes, EMBEDDING_DIM)).astype(np.float32)
+    p /= np.linalg.norm(p, axis=1, keepdims=True)
+    if probes == 1:
+        return lambda: gallery.match(p[0])
+    return lambda: gallery.match_many(p)
+
+
+def build_cases(quick: bool) -> dict[str, Callable[[], Callable]]:
+    """
+    Benchmark name -> factory doing the setup and returning the function to
+    time; only the selected cases are built, so --only skips unrelated setup
+    such as the large galleries.
+    """
+    cases = {
+        # postprocessors on synthetic raw tensors
+        "scrfd_forward": _scrfd_forward,
+        "detections_to_arrays": _detections_to_arrays,
+        "dequantize_forward": _dequantize_forward,
+        # per-face geometry
+        "align_and_crop": partial(_align_and_crop, False),
+        "align_and_crop_hires": partial(_align_and_crop, True),
+        "detection_quality_8": _detection_quality,
+    }
+    # gallery matching
+    for n in GALLERY_SIZES[:2] if quick else GALLERY_SIZES:
+        cases[f"gallery_match_{n}"] = partial(_gallery_match, n, 1)
+        cases[f"gallery_match_many4_{n}"] = partial(_gallery_match, n, 4)
+    return cases
+
+
+def run_case(fn, min_time: float, min_iters: int, alloc_iters: int) -> dict:
+    """
+    Time fn per call, then measure its allocations with tracemalloc.
+    """
+    for _ in range(3):   # warm-up (caches, lazy allocations)
+        fn()
+    times = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < min_iters or time.perf_counter() < deadline:
+        t0 = time.perf_counter_ns()
+        fn()
+        times.append(time.perf_counter_ns() - t0)
+    us = np.asarray(times, dtype=np.float64) / 1000.0
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(alloc_iters):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    return {
+        "iterations": len(times),
+        "mean_us": round(float(us.mean()), 2),
+        "p50_us": round(float(np.percentile(us, 50)), 2),
+        "p90_us": round(float(np.percentile(us, 90)), 2),
+        "p99_us": round(float(np.percentile(us, 99)), 2),
+        "alloc_peak_kb": round(max(peaks) / 1024.0, 1),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Print a comparison table.
+
+    :return: names of benchmarks whose p50 or allocation regressed by more
+             than `threshold` (relative)
+    """
+    regressions = []
+    print(f"\n{'benchmark':<28}{'base p50':>12}{'p50':>12}{'change':>9}{'alloc kb':>16}  status")
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<28}{'-':>12}{res['p50_us']:>12.1f}{'':>9}{res['alloc_peak_kb']:>16.1f}  new")
+            continue
+        change = res["p50_us"] / base["p50_us"] - 1 if base["p50_us"] else 0.0
+        alloc_change = (res["alloc_peak_kb"] - base["alloc_peak_kb"]) / max(base["alloc_peak_kb"], 1.0)
+        status = "ok"
+        if change > threshold or alloc_change > threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            status = "faster"
+        alloc = f"{base['alloc_peak_kb']:.0f}->{res['alloc_peak_kb']:.0f}"
+        print(f"{name:<28}{base['p50_us']:>12.1f}{res['p50_us']:>12.1f}{change:>+9.0%}{alloc:>16}  {status}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recognition hot-path microbenchmarks")
+    parser.add_argument("--save", metavar="FILE", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown reported as a regression (default %(default)s)")
+    parser.add_argument("--only", metavar="SUBSTR", help="run benchmarks whose name contains SUBSTR")
+    parser.add_argument("--quick", action="store_true", help="shorter runs, small galleries only")
+    args = parser.parse_args(argv)
+
+    min_time, min_iters, alloc_iters = (0.2, 20, 3) if args.quick else (1.0, 100, 10)
+    results = {}
+    for name, factory in build_cases(args.quick).items():
+        if args.only and args.only not in name:
+            continue
+        results[name] = res = run_case(factory(), min_time, min_iters, alloc_iters)
+        print(f"[benchmark] {name:<28} p50 {res['p50_us']:>10.1f} us  p99 {res['p99_us']:>10.1f} us  "
+              f"alloc {res['alloc_peak_kb']:>8.1f} kb  ({res['iterations']} calls)")
+
+    if args.save:
+        doc = {
+            "meta": {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "platform": platform.platform(),
+            },
+            "results": results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(doc, f, indent=2)
+        print(f"[benchmark] Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("machine") != platform.machine():
+            print("[benchmark] Warning: baseline was recorded on a different machine type")
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print(f"[benchmark] {len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
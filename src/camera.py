@@ -1,45 +1,360 @@
 # camera.py
 """
-CameraThread encapsulates Picamera2 capture in a background thread,
-providing the latest frame on demand.
+Camera sources running in a background thread, publishing frames with a
+monotonically increasing sequence number and their capture time:
+- CameraThread: Picamera2 capture (picamera2 is imported on construction)
+- FileCameraThread: frames from a video file or an image directory, for
+  running the pipeline off a Pi (see hal.create_camera)
+
+With CAMERA_MAIN_SIZE set, every capture is published as a CAMERA_SIZE frame
+for detection (the Picamera2 lores stream, or a downscale of the file frame)
+plus a HiresFrame handle on the full-resolution image. The full-resolution
+image is never copied as a whole: once the detector has found faces that need
+embedding, HiresFrame.crop() copies just those regions out of it. The camera
+keeps only the latest CAMERA_HIRES_HOLD captures' buffers; older handles are
+released and crop() on them returns None.
+
+Detection frames are converted or copied into a ring of preallocated buffers
+instead of allocating new arrays per frame. A consumer that needs a frame for
+longer than CAMERA_RING_SIZE captures must copy it.
 """
+import os
 import threading
 import time
-from picamera2 import Picamera2
-from config import CAMERA_FORMAT, CAMERA_SIZE
+from collections import deque
+from contextlib import closing
+import cv2
+import numpy as np
+from metrics import METRICS
+from config import (
+    CAMERA_FORMAT, CAMERA_SIZE, CAMERA_MAIN_SIZE, CAMERA_LORES_FORMAT, CAMERA_RING_SIZE,
+    CAMERA_HIRES_HOLD, CAMERA_HIRES_ROI_PAD, CAMERA_SIM_FPS, CAMERA_SIM_LOOP,
+)
+
+_IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def unpad_i420(yuv: np.ndarray, w: int, h: int, stride: int, out: np.ndarray) -> np.ndarray:
+    """
+    Repack an I420 image whose rows are padded to `stride` bytes (U and V
+    rows to stride / 2) into the contiguous (h * 3 / 2, w) layout cv2 expects.
+
+    :param yuv: mapped buffer, any shape, planes laid out back to back
+    :param out: (h * 3 // 2, w) uint8 destination
+    """
+    flat = yuv.reshape(-1)
+    cw, ch, cs = w // 2, h // 2, stride // 2
+    u0 = h * stride
+    v0 = u0 + ch * cs
+    out[:h] = flat[:u0].reshape(h, stride)[:, :w]
+    chroma = out[h:].reshape(-1)
+    chroma[:ch * cw] = flat[u0:v0].reshape(ch, cs)[:, :cw].reshape(-1)
+    chroma[ch * cw:] = flat[v0:v0 + ch * cs].reshape(ch, cs)[:, :cw].reshape(-1)
+    return out
+
+
+class HiresFrame:
+    """
+    Full-resolution image of one capture, held (as a Picamera2 request or a
+    decoded array) until it is released.
+    """
+    def __init__(self, scale, request=None, mapped_array=None, image: np.ndarray | None = None):
+        """
+        :param scale: (sx, sy) mapping detection-frame to full-resolution coordinates
+        :param request: Picamera2 request holding the "main" stream buffer
+        :param mapped_array: picamera2.MappedArray, to map the request's buffer
+        :param image: full-resolution image (instead of a request)
+        """
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self._request = request
+        self._mapped_array = mapped_array
+        self._image = image
+        self._lock = threading.Lock()
+        self.released = False
+
+    def crop(self, boxes, pad: float = CAMERA_HIRES_ROI_PAD) -> list | None:
+        """
+        Copy the regions around some detections out of the full-resolution image.
+
+        :param boxes: (N, 4) boxes in detection-frame coordinates
+        :param pad: margin around each box, as a fraction of its size
+        :return: [(roi, (x0, y0))] with each roi's origin in full-resolution
+                 pixels, or None if the image was already released
+        """
+        with self._lock:
+            if self.released:
+                return None
+            if self._request is None:
+                return self._crop(self._image, boxes, pad)
+            with self._mapped_array(self._request, "main") as m:
+                return self._crop(m.array, boxes, pad)
+
+    def _crop(self, img: np.ndarray, boxes, pad: float) -> list:
+        h, w = img.shape[:2]
+        rois = []
+        for x1, y1, x2, y2 in np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * np.tile(self.scale, 2):
+            mx, my = (x2 - x1) * pad, (y2 - y1) * pad
+            x0, y0 = max(int(x1 - mx), 0), max(int(y1 - my), 0)
+            xe, ye = min(int(x2 + mx) + 1, w), min(int(y2 + my) + 1, h)
+            # copy: the camera buffer goes back to libcamera on release()
+            rois.append((img[y0:ye, x0:xe, :3].copy(), (x0, y0)))
+        return rois
 
-class CameraThread(threading.Thread):
+    def release(self) -> None:
+        """Give the buffer back (idempotent)."""
+        with self._lock:
+            if self.released:
+                return
+            self.released = True
+            if self._request is not None:
+                self._request.release()
+            self._request = self._image = None
+
+
+class FrameSource(threading.Thread):
+    """
+    Frame rings and publication shared by all camera sources; subclasses
+    implement run() and call publish() for every captured frame.
+    """
     def __init__(self):
         super().__init__(daemon=True)
-        # Initialize Picamera2 with preview configuration
-        self.picam2 = Picamera2()
-        self.cfg = self.picam2.create_preview_configuration(
-            main={"format": CAMERA_FORMAT, "size": CAMERA_SIZE}
-        )
-        self.picam2.configure(self.cfg)
+        # Preallocated frame rings per stream name: [buffers, next slot]
+        # (allocated lazily once the shape is known)
+        self._rings: dict[str, list] = {}
 
-        # Shared frame buffer and lock
+        # Latest published frame (detection size), its HiresFrame (None for
+        # single-stream sources), sequence number,
+        # capture time (time.monotonic()) and the wakeup condition
         self.frame = None
+        self.hires = None
+        self.seq = 0
+        self.captured = 0.0
         self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+
+    def _next_buffer(self, stream: str, shape: tuple, dtype=np.uint8) -> np.ndarray:
+        """
+        Return the next slot of a stream's ring, (re)allocating the ring if
+        the shape changed.
+        """
+        ring = self._rings.get(stream)
+        if ring is None or ring[0][0].shape != tuple(shape):
+            ring = self._rings[stream] = [[np.empty(shape, dtype) for _ in range(CAMERA_RING_SIZE)], 0]
+        bufs, slot = ring
+        ring[1] = (slot + 1) % len(bufs)
+        return bufs[slot]
+
+    def publish(self, frame: np.ndarray, hires: HiresFrame | None = None,
+                captured: float | None = None) -> None:
+        """
+        Make frame (and its full-resolution counterpart) the latest capture.
+        The frame is shared with consumers, not copied: the source must not
+        write to it again (ring slots are reused only after a full cycle).
+
+        :param frame: detection-size frame (H x W x 3)
+        :param hires: full-resolution image of the same capture, or None
+        :param captured: time.monotonic() of the capture (default: now)
+        """
+        captured = time.monotonic() if captured is None else captured
+        with self.cond:
+            self.frame = frame
+            self.hires = hires
+            self.seq += 1
+            self.captured = captured
+            self.cond.notify_all()
+        METRICS.inc("frames_captured")
+
+    def get_frame(self):
+        """
+        Return the most recent frame (or None if not yet available).
+        """
+        with self.lock:
+            return self.frame
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: float | None = None):
+        """
+        Block until a frame newer than `after_seq` is published.
+
+        :param after_seq: sequence number of the last frame the caller saw
+        :param timeout: maximum seconds to wait (None waits forever)
+        :return: (seq, frame, hires, captured), or (after_seq, None, None, None)
+                 on timeout; hires is None for single-stream sources
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > after_seq, timeout):
+                return after_seq, None, None, None
+            return self.seq, self.frame, self.hires, self.captured
+
+
+class CameraThread(FrameSource):
+    def __init__(self):
+        super().__init__()
+        from picamera2 import Picamera2, MappedArray
+        self._mapped_array = MappedArray
+        # Initialize Picamera2 with preview configuration: a full-resolution
+        # main stream plus a lores stream at detection size, or just main.
+        # Held full-resolution requests need buffers beyond the ones in flight.
+        self.picam2 = Picamera2()
+        if CAMERA_MAIN_SIZE:
+            self.cfg = self.picam2.create_preview_configuration(
+                main={"format": CAMERA_FORMAT, "size": CAMERA_MAIN_SIZE},
+                lores={"format": CAMERA_LORES_FORMAT, "size": CAMERA_SIZE},
+                buffer_count=CAMERA_HIRES_HOLD + 3,
+            )
+        else:
+            self.cfg = self.picam2.create_preview_configuration(
+                main={"format": CAMERA_FORMAT, "size": CAMERA_SIZE}
+            )
+        self.picam2.configure(self.cfg)
+        # bytes per lores Y row: more than the width when the ISP pads rows
+        # (YUV420 widths that are not a multiple of 64 on a Pi 4)
+        self._lores_stride = self.picam2.camera_config["lores"]["stride"] if CAMERA_MAIN_SIZE else None
+        self._i420 = None
+
+    def _copy_stream(self, request, stream: str) -> np.ndarray:
+        """Copy an RGB stream of the request into its ring."""
+        with self._mapped_array(request, stream) as m:
+            buf = self._next_buffer(stream, m.array.shape[:2] + (3,))
+            np.copyto(buf, m.array[..., :3])
+        return buf
+
+    def _lores_frame(self, request) -> np.ndarray:
+        """
+        The lores stream as a BGR frame (same byte order as an RGB888 main
+        stream), converted straight into its ring slot.
+        """
+        if CAMERA_LORES_FORMAT != "YUV420":
+            return self._copy_stream(request, "lores")
+        w, h = CAMERA_SIZE
+        with self._mapped_array(request, "lores") as m:
+            # I420: h rows of Y, then h/2 rows holding the U and V planes
+            yuv = m.array
+            if self._lores_stride != w:
+                if self._i420 is None:
+                    self._i420 = np.empty((h * 3 // 2, w), np.uint8)
+                yuv = unpad_i420(yuv, w, h, self._lores_stride, self._i420)
+            buf = self._next_buffer("lores", (h, w, 3))
+            cv2.cvtColor(yuv[:h * 3 // 2, :w], cv2.COLOR_YUV2BGR_I420, dst=buf)
+        return buf
 
     def run(self):
         """
-        Continuously capture frames and store the latest one.
+        Continuously capture frames into the ring and publish the latest one;
+        with a full-resolution stream, the latest CAMERA_HIRES_HOLD requests
+        stay held for face crops.
         """
+        scale = (CAMERA_MAIN_SIZE[0] / CAMERA_SIZE[0], CAMERA_MAIN_SIZE[1] / CAMERA_SIZE[1]) \
+            if CAMERA_MAIN_SIZE else None
+        held = deque()
         self.picam2.start()
         try:
             while True:
-                img = self.picam2.capture_array()
-                with self.lock:
-                    self.frame = img
-                # throttle capture rate slightly
-                time.sleep(0.01)
+                request = self.picam2.capture_request()
+                captured = time.monotonic()
+                if not CAMERA_MAIN_SIZE:
+                    try:
+                        frame = self._copy_stream(request, "main")
+                    finally:
+                        request.release()
+                    self.publish(frame, None, captured)
+                    continue
+                try:
+                    lores = self._lores_frame(request)
+                except Exception:
+                    request.release()
+                    raise
+                hires = HiresFrame(scale, request, self._mapped_array)
+                held.append(hires)
+                while len(held) > CAMERA_HIRES_HOLD:
+                    held.popleft().release()
+                self.publish(lores, hires, captured)
         finally:
+            for hires in held:
+                hires.release()
             self.picam2.stop()
 
-    def get_frame(self):
+
+class FileCameraThread(FrameSource):
+    def __init__(self, source: str, fps: float = CAMERA_SIM_FPS, loop: bool = CAMERA_SIM_LOOP):
         """
-        Return the most recent frame (or None if not yet available).
+        :param source: video file, or directory of images (played in name order)
+        :param fps: playback rate; 0 publishes frames as fast as they decode
+        :param loop: restart from the beginning at the end of the source
         """
-        with self.lock:
-            return self.frame
+        super().__init__()
+        self.source = source
+        self.fps = fps
+        self.loop = loop
+        self.finished = threading.Event()
+        if os.path.isdir(source):
+            self.paths = sorted(os.path.join(source, f) for f in os.listdir(source)
+                                if f.lower().endswith(_IMAGE_EXTS))
+            if not self.paths:
+                raise FileNotFoundError(f"no images in {source}")
+        elif os.path.isfile(source):
+            self.paths = None
+        else:
+            raise FileNotFoundError(f"camera source not found: {source}")
+
+    def _frames(self):
+        """
+        One pass over the source as BGR images of CAMERA_MAIN_SIZE (or
+        CAMERA_SIZE for a single stream); every image is a new array.
+        """
+        size = tuple(CAMERA_MAIN_SIZE or CAMERA_SIZE)
+        cap = None
+        if self.paths is not None:
+            images = (cv2.imread(p, cv2.IMREAD_COLOR) for p in self.paths)
+        else:
+            cap = cv2.VideoCapture(self.source)
+            images = self._read_video(cap)
+        try:
+            for img in images:
+                if img is None:
+                    continue
+                if (img.shape[1], img.shape[0]) != size:
+                    img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+                yield img
+        finally:
+            # also runs when the generator is closed before the end
+            if cap is not None:
+                cap.release()
+
+    @staticmethod
+    def _read_video(cap):
+        while True:
+            ok, img = cap.read()
+            if not ok:
+                return
+            yield img
+
+    def _publish(self, img: np.ndarray) -> None:
+        if not CAMERA_MAIN_SIZE:
+            self.publish(img)   # a new array per frame: no copy needed
+            return
+        # equivalent of the lores stream: downscale into the ring
+        w, h = CAMERA_SIZE
+        lores = self._next_buffer("lores", (h, w, 3))
+        cv2.resize(img, (w, h), dst=lores, interpolation=cv2.INTER_AREA)
+        self.publish(lores, HiresFrame((img.shape[1] / w, img.shape[0] / h), image=img))
+
+    def run(self):
+        period = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_t = time.monotonic()
+        while True:
+            published = 0
+            with closing(self._frames()) as frames:
+                for img in frames:
+                    if period:
+                        next_t += period
+                        delay = next_t - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                        else:
+                            next_t = time.monotonic()   # fell behind: do not burst
+                    self._publish(img)
+                    published += 1
+            if not self.loop or not published:
+                break
+        self.finished.set()
+        print(f"[camera] {self.source}: end of input")
@@ -2,6 +2,17 @@
 """
 All configuration constants for the Face Door Control project.
 """
+import os
+
+# ─── BACKENDS (see hal.py) ────────────────────────────────────────────
+CAMERA_BACKEND   = "picamera2"   # "picamera2", "video" or "images"
+CAMERA_SOURCE    = ""            # video file / image directory for the file backends
+CAMERA_SIM_FPS   = 0.0           # file playback rate; 0 = as fast as frames decode
+CAMERA_SIM_LOOP  = True          # restart the file source at its end
+GPIO_BACKEND     = "rpi"         # "rpi" or "fake"
+MODEL_BACKEND    = "degirum"     # "degirum" or "replay"
+MODEL_REPLAY_DIR = os.path.expanduser("~/.cache/rpifacedetection/replay")  # <model>/*.npz recordings
+ULTRASONIC_SIM_DISTANCES_CM = [100.0]   # echo distances replayed by the fake GPIO, cycled
 
 # ─── SERVER & API ─────────────────────────────────────────────────────
 SERVER_URL       = "http://161.35.195.142:8000"
@@ -11,7 +22,48 @@ DOOR_ID          = "e43b48ac-6cce-430e-a119-5c5ff5d62967"
 DOOR_STATUS_URL  = f"{SERVER_URL}/api/doors/{DOOR_ID}/set-status/"
 WS_URL           = SERVER_URL.replace("http://", "ws://") + f"/ws/doors/{DOOR_ID}/"
 
+# Shared HTTP client (pooled keep-alive connections to the server)
+HTTP_POOL_CONNECTIONS = 4                 # hosts to keep connection pools for
+HTTP_POOL_SIZE        = 4                 # keep-alive connections per host
+HTTP_DEFAULT_TIMEOUT  = (3.05, 5.0)       # (connect, read) seconds
+HTTP_TIMEOUTS = {                         # per-endpoint (connect, read) overrides
+    "gallery_sync":  (3.05, 10.0),
+    "door_status":   (2.0, 3.0),
+    "unknown_face":  (3.05, 10.0),
+    "enroll_upload": (3.05, 10.0),
+}
+HTTP_GZIP_ENDPOINTS = ()                  # endpoints whose server accepts gzip request bodies
+HTTP_GZIP_MIN_BYTES = 1024                # smaller JSON bodies are sent uncompressed
+
+# Outbound notifications (background outbox with retry and on-disk spool)
+NOTIFY_SPOOL_PATH      = os.path.expanduser("~/.cache/rpifacedetection/notify-spool.jsonl")
+NOTIFY_QUEUE_SIZE      = 100             # queued uploads kept in memory; oldest dropped
+NOTIFY_RETRY_BASE_S    = 1.0             # first retry delay, doubled on each failure
+NOTIFY_RETRY_MAX_S     = 60.0            # retry delay cap
+NOTIFY_SPOOL_MAX_BYTES = 20 * 1024 * 1024  # oldest spooled uploads dropped beyond this
+# Unknown-face uploads (face crop + optional context thumbnail, encoded on the notifier thread)
+UNKNOWN_CROP_PAD         = 0.25       # margin around the box, as a fraction of its size
+UNKNOWN_CROP_MAX_PX      = 256        # longer side of the uploaded face crop
+UNKNOWN_THUMBNAIL_PX     = 320        # longer side of the context thumbnail; 0 disables it
+UNKNOWN_JPEG_QUALITY     = 85         # first JPEG quality tried
+UNKNOWN_JPEG_MIN_QUALITY = 40         # lowest quality before the thumbnail is dropped
+UNKNOWN_UPLOAD_MAX_BYTES = 64 * 1024  # encoded image bytes per upload (before base64)
+UNKNOWN_ENCODE_BUDGET_S  = 0.05       # stop lowering quality after this much encode time
+
 # ─── FACE RECOGNITION ─────────────────────────────────────────────────
+# Local gallery cache (memory-mapped embeddings + lazily decoded images)
+GALLERY_CACHE_DIR = os.path.expanduser("~/.cache/rpifacedetection/gallery")
+# Background gallery sync with the server
+GALLERY_SYNC_INTERVAL_S   = 60.0           # incremental sync period
+GALLERY_FULL_SYNC_S       = 3600.0         # full resync period (catches deletions)
+GALLERY_SYNC_CURSOR_PARAM = "updated_since"
+GALLERY_SYNC_MAX_PAGES    = 1000           # pagination safety limit
+
+# Enrollment requests from the websocket (worker pool off the receive thread)
+ENROLL_WORKERS     = 2      # worker threads; inference itself is serialized per model
+ENROLL_QUEUE_SIZE  = 8      # pending requests before new ones are rejected as busy
+ENROLL_MAX_IMAGES  = 10     # images per request; extras are reported as failed
+
 # Thresholds for matching embeddings
 THRESHOLD        = 0.6    # cosine similarity for known faces
 ANON_MATCH_THRES = 0.7    # similarity to group same unknown
@@ -23,12 +75,53 @@ UNKNOWN_COOLDOWN       = 30.0   # seconds between unknown notifications
 STALE_DURATION         = 10.0   # retain unknowns this long in history
 RECOGNIZED_DELAY       = 3.0    # must remain detected this long to open
 
+# Recognition pipeline (detect -> align/embed -> match)
+PIPELINE_QUEUE_SIZE       = 2      # per-stage queue bound; oldest frame dropped when full
+PIPELINE_MAX_LATENCY_S    = 0.5    # frames older than this are dropped before embedding
+PIPELINE_STATS_INTERVAL_S = 30.0   # how often queue depths are logged
+
+# Latency tracing and metrics (see metrics.py)
+METRICS_ENABLED           = True
+METRICS_HOST              = "127.0.0.1"   # local only
+METRICS_PORT              = 9108          # Prometheus text format at /metrics
+METRICS_WINDOW            = 1024          # recent samples per latency histogram
+METRICS_TRACE_FILE        = None          # JSONL file of per-event traces, e.g.
+                                          # os.path.expanduser("~/.cache/rpifacedetection/trace.jsonl")
+METRICS_TRACE_ALL_FRAMES  = False         # also write a line for every processed frame
+
+# Face tracking (ArcFace only runs for new/changed tracks)
+TRACK_IOU_THRESHOLD        = 0.3   # min IoU to continue a track
+TRACK_CENTROID_GATE        = 0.5   # else: max centroid shift, as a fraction of box diagonal
+TRACK_MAX_AGE_S            = 1.0   # drop tracks unseen this long
+TRACK_REEMBED_INTERVAL_S   = 2.0   # refresh a decided identity this often
+TRACK_REEMBED_IOU          = 0.5   # re-embed early if the box drifts below this IoU
+TRACK_UNDECIDED_INTERVAL_S = 0.2   # embedding interval while identity is borderline
+TRACK_EMBED_WINDOW         = 5     # embeddings averaged per track; also the max
+                                   # inferences before a borderline track is called unknown
+
+# Face quality gate (skip crops that cannot reach THRESHOLD)
+FACE_QUALITY_MIN       = 0.3    # combined quality below this is not embedded
+QUALITY_MIN_FACE_PX    = 40     # box side at which size quality is 0
+QUALITY_GOOD_FACE_PX   = 100    # box side at which size quality is 1
+QUALITY_MAX_YAW        = 0.6    # nose offset / eye distance at which pose quality is 0
+QUALITY_MAX_ROLL_DEG   = 35.0   # eye-line tilt at which pose quality is 0
+QUALITY_SHARPNESS_GOOD = 100.0  # Laplacian variance of a sharp 112x112 crop
+
+# Motion gate in front of the detector
+MOTION_GATE_ENABLED   = True
+MOTION_SIZE           = (80, 80)  # (w, h) of the downscaled comparison image
+MOTION_PIXEL_DELTA    = 15        # grey-level change that counts as a changed pixel
+MOTION_MIN_AREA       = 0.01      # fraction of changed pixels that counts as motion
+MOTION_BG_ALPHA       = 0.05      # background running-average rate
+MOTION_KEEPALIVE_S    = 2.0       # always detect at least this often
+
 # ─── MODELS ───────────────────────────────────────────────────────────\# SCRFD for face detection
 FACE_DET_MODEL      = "scrfd_2.5g--640x640_quant_hailort_hailo8l_1"
 # ArcFace for face recognition
 FACE_REC_MODEL      = "arcface_mobilefacenet--112x112_quant_hailort_hailo8l_1"
 INFERENCE_HOST      = "@local"
 ZOO_URL             = "models"
+FACE_DET_INPUT_SIZE = (640, 640)   # (w, h) detector input; other images are letterboxed
 
 # ─── SERVO (DOOR) ─────────────────────────────────────────────────────
 # BCM pin for servo signal
@@ -43,8 +136,19 @@ HOLD_TIME        = 1    # seconds
 
 # ─── CAMERA ────────────────────────────────────────────────────────────
 CAMERA_FORMAT    = "RGB888"
-CAMERA_SIZE      = (640, 640)
+# Sensor-aspect sizes (4:3 as on the IMX219/IMX477; 16:9 such as (1280, 720)
+# and (640, 360) on a Camera Module 3) avoid an extra ISP crop; the detector
+# letterboxes frames to its square input
+CAMERA_SIZE      = (640, 480)    # detection frames (Picamera2 lores stream when dual-stream)
+CAMERA_MAIN_SIZE = (1280, 960)   # full-resolution frames faces are aligned from; None = single stream
+CAMERA_LORES_FORMAT = "YUV420"   # lores stream format ("YUV420" on Pi 4; Pi 5 also takes "RGB888")
+CAMERA_HIRES_HOLD    = 3         # latest full-resolution captures kept for face crops
+CAMERA_HIRES_ROI_PAD = 0.5       # margin copied around each face box, as a fraction of its size
 STREAM_SIZE      = (640, 640)  # MJPEG/WS stream resolution
+# Preallocated detection-frame buffers; must cover every frame still in
+# flight in the recognition pipeline (detect + queued + embedding + matching)
+CAMERA_RING_SIZE = 16
+CAMERA_WAIT_TIMEOUT_S = 1.0   # recognizer wakes at least this often without frames
 
 # ─── LOGGING & MISC ───────────────────────────────────────────────────
 LOG_LEVEL        = "INFO"   # DEBUG, INFO, WARN, ERROR
@@ -56,6 +160,13 @@ ULTRASONIC_ECHO_PIN        = 24   # BCM pin for ECHO
 ULTRASONIC_THRESHOLD_CM    = 15.0  # distance under which we trigger
 ULTRASONIC_HOLD_TIME_S     = 7.0  # must stay under threshold this long
 ULTRASONIC_MEASURE_INTERVAL_S = 0.1  # how often to measure (seconds)
+ULTRASONIC_MODE            = "edge"  # "edge": time the echo from GPIO edge callbacks; "poll": busy-wait
+ULTRASONIC_FILTER_WINDOW   = 5     # readings in the median filter
+ULTRASONIC_HYSTERESIS_CM   = 3.0   # "clear" only above THRESHOLD + this
+ULTRASONIC_MIN_CM          = 2.0   # readings outside the sensor range are discarded
+ULTRASONIC_MAX_CM          = 400.0
+ULTRASONIC_MAX_MISSES      = 3     # consecutive discarded readings that mean "nothing in range"
+ULTRASONIC_ECHO_RISE_MAX_S = 0.003  # echo starts within this of the trigger; later callbacks are stale
 
 UNKNOWN_SIM_THRESHOLD = 0.1
 # End of config.py
@@ -1,48 +1,144 @@
 # door_controller.py
 """
 DoorController encapsulates servo initialization and door state management.
+
+Motion runs on a dedicated executor thread, so open()/close() return at once;
+start() launches it once the listeners are wired. The door moves through the
+states
+
+    CLOSED -> OPENING -> OPEN -> CLOSING -> CLOSED
+
+Only the latest requested position is kept: a command for the position the
+door is already in or moving to is merged; one for the opposite position
+cancels the motion in progress and reverses from where the servo is. A
+motion lasts HOLD_TIME (the servo pulse time), after which the pulses are
+stopped, the status is sent to the server and listeners are called with
+(old_state, new_state) on every state change. The delay from a command to
+the first servo pulse is recorded as door_actuation_seconds (metrics.py).
 """
+import threading
 import time
+from typing import Callable
 import servo
 from config import OPEN_ANGLE, CLOSED_ANGLE, HOLD_TIME
+from metrics import METRICS
 from notifier import notify_status
 
+CLOSED  = "CLOSED"
+OPENING = "OPENING"
+OPEN    = "OPEN"
+CLOSING = "CLOSING"
+
+_MOTION = {OPEN: (OPENING, OPEN_ANGLE), CLOSED: (CLOSING, CLOSED_ANGLE)}
+
+
 class DoorController:
-    def __init__(self):
-        """
-        Initialize the servo hardware and ensure door starts in closed position.
+    def __init__(self, gpio=None, motion_time: float = HOLD_TIME, notify: bool = True):
         """
-        # Initialize servo PWM and set to closed angle
-        servo.init_servo()
-        self.is_open = False
-        self._move(CLOSED_ANGLE)
-        notify_status("CLOSED")
+        Initialize the servo hardware; the door is driven to the closed
+        position once start() is called.
 
+        :param gpio: GPIO implementation for the servo (RPi.GPIO if None)
+        :param motion_time: how long the servo is driven for one move
+        :param notify: send each completed position to the server
+        """
+        # Initialize servo PWM; the executor closes the door first
+        servo.init_servo(gpio=gpio)
+        self.motion_time = motion_time
+        self.notify = notify
+        self.state = CLOSING
+        self._target = CLOSED
+        self._requested = time.monotonic()
+        self._cond = threading.Condition()
+        self._listeners: list[Callable[[str, str], None]] = []
+        self.merged = 0
+        self.reversed = 0
+        self._thread = threading.Thread(target=self._run, name="door", daemon=True)
 
-    def _move(self, angle: float) -> None:
+    def start(self) -> None:
         """
-        Move servo to given angle and hold briefly to ensure position.
+        Start the executor. Call it after add_listener() so no state change,
+        including the initial close, goes unreported; commands issued before
+        are carried out then.
         """
-        servo._move_to(angle)  # assumes servo module provides internal move
-        time.sleep(HOLD_TIME)
+        self._thread.start()
+
+    # ─── Commands (non-blocking) ─────────────────────────────────────────
+    @property
+    def is_open(self) -> bool:
+        """True unless the door is closed or closing."""
+        return self.state in (OPENING, OPEN)
+
+    def add_listener(self, fn: Callable[[str, str], None]) -> None:
+        """Call fn(old_state, new_state) from the executor on every state change."""
+        self._listeners.append(fn)
 
-    def open(self) -> None:
+    def open(self) -> bool:
         """
-        Open the door (move servo to OPEN_ANGLE) if not already open.
+        Request the open position.
+
+        :return: True if the door will move, False if it is already open or opening
         """
-        if not self.is_open:
-            self._move(OPEN_ANGLE)
-            self.is_open = True
-            notify_status("OPEN")
+        return self._request(OPEN)
 
     def close(self) -> bool:
         """
-        Close the door (move servo to CLOSED_ANGLE) if not already closed.
-        Returns True if door was closed, False if already closed.
+        Request the closed position.
+
+        :return: True if the door will move, False if it is already closed or closing
         """
-        if self.is_open:
-            self._move(CLOSED_ANGLE)
-            self.is_open = False
-            notify_status("CLOSED")
+        return self._request(CLOSED)
+
+    def _request(self, target: str) -> bool:
+        with self._cond:
+            if self._target == target:
+                self.merged += 1
+                return False
+            self._target = target
+            self._requested = time.monotonic()
+            self._cond.notify()
             return True
-        return False
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """
+        Block until the door rests in the requested position.
+
+        :return: False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.state == self._target, timeout)
+
+    # ─── Executor ────────────────────────────────────────────────────────
+    def _set_state(self, state: str) -> None:
+        with self._cond:
+            old, self.state = self.state, state
+            self._cond.notify_all()
+        for fn in self._listeners:
+            try:
+                fn(old, state)
+            except Exception as e:
+                print(f"[door] listener error: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.state != self._target)
+                target, requested = self._target, self._requested
+            moving, angle = _MOTION[target]
+            if self.state != moving:
+                self._set_state(moving)
+            servo.set_angle(angle)
+            METRICS.observe("door_actuation_seconds", time.monotonic() - requested, target=target)
+
+            # drive for motion_time unless a new command reverses the door
+            deadline = time.monotonic() + self.motion_time
+            with self._cond:
+                reversed_ = self._cond.wait_for(
+                    lambda: self._target != target, max(0.0, deadline - time.monotonic()))
+            if reversed_:
+                self.reversed += 1
+                continue
+            servo.release()
+            self._set_state(target)
+            if self.notify:
+                notify_status(target)
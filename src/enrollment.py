@@ -0,0 +1,212 @@
+# enrollment.py
+"""
+EnrollmentPool handles face enrollment requests from the websocket off the
+receive thread, so door commands are never stuck behind decoding, inference
+or the upload to the server.
+
+Requests go into a bounded queue served by ENROLL_WORKERS threads; when the
+queue is full the request is rejected right away. Each request may carry a
+batch of images for one person ("face_images_base64", or the single
+"face_image_base64"): every image is decoded and detected, all crops are
+embedded in one batched call and one background save of the gallery cache
+is requested.
+
+New entries are matched right away under a temporary "local-..." id; once
+the upload returns the server id, the entry is re-keyed to it, so the next
+gallery sync updates the entry instead of adding the same face again.
+The outcome, including upload failures, is passed to the `reply` callback
+as a "face_recognition_result" message.
+"""
+import base64
+import queue
+import threading
+import uuid
+from typing import Callable
+import cv2
+import numpy as np
+import requests
+
+from config import FACE_DATA_URL, ENROLL_WORKERS, ENROLL_QUEUE_SIZE, ENROLL_MAX_IMAGES
+from gallery_store import request_save
+from http_client import get_http_client
+from inference import get_inference_service
+from utils import GALLERY, align_and_crop, encode_image_to_base64
+
+
+def decode_image_base64(b64img: str) -> np.ndarray | None:
+    """
+    Decode a (data URI or plain) base64 image.
+
+    :return: BGR image, or None if it cannot be decoded
+    """
+    try:
+        if b64img.startswith("data:image"):
+            b64img = b64img.split(",", 1)[1]
+        img_array = np.frombuffer(base64.b64decode(b64img), np.uint8)
+        return cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    except (ValueError, TypeError, cv2.error):
+        return None
+
+
+def request_images(data: dict) -> list[str]:
+    """All base64 images of an enrollment request, batch field first."""
+    images = data.get("face_images_base64") or []
+    if isinstance(images, str):
+        images = [images]
+    if data.get("face_image_base64"):
+        images = list(images) + [data["face_image_base64"]]
+    return [b for b in images if isinstance(b, str) and b]
+
+
+def _response_json(resp) -> dict:
+    try:
+        body = resp.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+class EnrollmentPool:
+    def __init__(self, reply: Callable[[dict], None],
+                 workers: int = ENROLL_WORKERS, maxsize: int = ENROLL_QUEUE_SIZE):
+        """
+        :param reply: called from a worker thread with each result message
+        :param workers: number of worker threads
+        :param maxsize: pending requests accepted before rejecting new ones
+        """
+        self.reply = reply
+        self._q = queue.Queue(maxsize=max(1, maxsize))
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"enroll-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        self.started = False
+        self.rejected = 0
+        self.completed = 0
+
+    def start(self) -> None:
+        if not self.started:
+            self.started = True
+            for w in self._workers:
+                w.start()
+
+    def submit(self, data: dict) -> bool:
+        """
+        Queue an enrollment request without blocking.
+
+        :return: False (and a "busy" reply) if the queue is full
+        """
+        self.start()
+        try:
+            self._q.put_nowait(data)
+            return True
+        except queue.Full:
+            self.rejected += 1
+            print(f"[enrollment] Queue full, rejecting request {data.get('request_id')}")
+            self.reply(self._result(data, "busy", error="enrollment queue full"))
+            return False
+
+    def stats(self) -> dict:
+        return {"depth": self._q.qsize(), "rejected": self.rejected, "completed": self.completed}
+
+    def _worker(self):
+        while True:
+            data = self._q.get()
+            try:
+                result = self.enroll(data)
+            except Exception as e:
+                print(f"[enrollment] Request {data.get('request_id')} failed: {e}")
+                result = self._result(data, "error", error=str(e))
+            self.completed += 1
+            self.reply(result)
+
+    @staticmethod
+    def _result(data: dict, status: str, **fields) -> dict:
+        return {
+            "type": "face_recognition_result",
+            "request_id": data.get("request_id"),
+            "name": data.get("name"),
+            "status": status,
+            **fields,
+        }
+
+    def enroll(self, data: dict) -> dict:
+        """
+        Detect, embed, store and upload every image of one request.
+
+        :return: result message with per-image failures and upload errors
+        """
+        name = data.get("name")
+        user_id = data.get("user_id", 1)  # fallback if not provided
+        device_id = data.get("device_id", "cam01")
+        request_id = data.get("request_id")
+        images = request_images(data)
+        if not name or not images:
+            return self._result(data, "error", error="name and image data are required")
+
+        failed = [{"index": i, "reason": "too many images"} for i in range(ENROLL_MAX_IMAGES, len(images))]
+        models = get_inference_service()
+        faces, indices = [], []
+        for i, b64img in enumerate(images[:ENROLL_MAX_IMAGES]):
+            img = decode_image_base64(b64img)
+            if img is None:
+                failed.append({"index": i, "reason": "invalid image"})
+                continue
+            boxes, _, landmarks = models.detect(img)
+            if len(boxes) == 0:
+                failed.append({"index": i, "reason": "no face detected"})
+                continue
+            faces.append(align_and_crop(img, landmarks[0]))
+            indices.append(i)
+
+        embs = models.embed(faces) if faces else np.empty((0, 0), np.float32)
+        enrolled = []
+        for i, face, e in zip(indices, faces, embs):
+            if e.any():
+                enrolled.append((i, face, e))
+            else:
+                failed.append({"index": i, "reason": "no embedding extracted"})
+        failed.sort(key=lambda f: f["index"])
+        if not enrolled:
+            print(f"[enrollment] Nothing enrolled for '{name}'")
+            return self._result(data, "error", enrolled=0, failed=failed)
+
+        local_ids = []
+        for _, face, e in enrolled:
+            local_ids.append(f"local-{uuid.uuid4().hex}")
+            GALLERY.add(name, e, face, meta={"id": local_ids[-1]})
+        request_save(GALLERY)
+        print(f"[enrollment] Enrolled {len(enrolled)}/{len(images)} images for '{name}'")
+
+        upload_errors, rekeyed, uploaded_ids = [], [], []
+        for (i, face, e), local_id in zip(enrolled, local_ids):
+            payload = {
+                "name": name,
+                "user": user_id,
+                "vector_data": e.tolist(),
+                "face_image_base64": encode_image_to_base64(face),
+                "metadata": {"source": "camera", "device_id": device_id, "request_id": request_id}
+            }
+            try:
+                resp = get_http_client().post(FACE_DATA_URL, "enroll_upload", json=payload)
+                resp.raise_for_status()
+                print(f"[enrollment] Face vector uploaded ({resp.status_code})")
+            except requests.RequestException as ex:
+                print(f"[enrollment] Failed to upload face vector: {ex}")
+                upload_errors.append({"index": i, "reason": str(ex)})
+                continue
+            created = _response_json(resp)
+            if created.get("id") is None:
+                print("[enrollment] Upload response has no id; entry kept under its local id")
+                continue
+            rekeyed.append((name, e, face,
+                            {k: created[k] for k in ("id", "updated_at") if created.get(k) is not None}))
+            uploaded_ids.append(local_id)
+
+        # replace the local ids with the server's in one snapshot
+        if rekeyed:
+            GALLERY.apply_changes(rekeyed, deletes=uploaded_ids)
+            request_save(GALLERY)
+
+        return self._result(data, "ok" if not upload_errors else "upload_failed",
+                            enrolled=len(enrolled), failed=failed, upload_errors=upload_errors)
@@ -0,0 +1,112 @@
+# events.py
+"""
+Single event source for the main control loop.
+
+Every producer (websocket commands, recognition events, ultrasonic state
+changes) posts typed Events into one EventQueue, and timers scheduled with
+call_later() are delivered through the same queue. The main loop blocks in
+get() until the next event or the next due timer, so idle time costs no
+wakeups.
+
+Threads written against a queue.Queue-like put() can be handed a channel(),
+which wraps each item in an Event of a fixed kind.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+# Event kinds
+EVT_COMMAND     = "command"       # data: "OPEN" / "CLOSED" from the websocket
+EVT_RECOGNITION = "recognition"   # data: recognizer event tuple
+EVT_ULTRASONIC  = "ultrasonic"    # data: ("near" | "clear", distance_cm)
+EVT_AUTO_CLOSE  = "auto_close"    # timer: object held in front of the sensor
+EVT_DOOR        = "door"          # data: (old_state, new_state) from DoorController
+
+
+@dataclass
+class Event:
+    kind: str
+    data: Any = None
+    time: float = field(default_factory=time.monotonic)   # when it was posted / fell due
+
+
+@dataclass(eq=False)
+class Timer:
+    due: float
+    kind: str
+    data: Any = None
+    cancelled: bool = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class EventChannel:
+    """queue.Queue-style put() that posts events of one kind."""
+    def __init__(self, events: "EventQueue", kind: str):
+        self.events = events
+        self.kind = kind
+
+    def put(self, item: Any) -> None:
+        self.events.post(self.kind, item)
+
+
+class EventQueue:
+    def __init__(self):
+        self._events = deque()
+        self._timers = []                 # heap of (due, seq, Timer)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.posted = 0
+        self.timers_fired = 0
+
+    def post(self, kind: str, data: Any = None) -> None:
+        """Add an event (thread-safe, never blocks)."""
+        with self._cond:
+            self._events.append(Event(kind, data))
+            self.posted += 1
+            self._cond.notify()
+
+    def channel(self, kind: str) -> EventChannel:
+        return EventChannel(self, kind)
+
+    def call_later(self, delay: float, kind: str, data: Any = None) -> Timer:
+        """
+        Deliver an event of `kind` after `delay` seconds.
+
+        :return: the timer; cancel() it to suppress the event
+        """
+        timer = Timer(time.monotonic() + delay, kind, data)
+        with self._cond:
+            heapq.heappush(self._timers, (timer.due, next(self._seq), timer))
+            self._cond.notify()
+        return timer
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        Next event, waiting for producers or the next due timer.
+
+        :return: the event, or None after `timeout` seconds without one
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    due, _, timer = heapq.heappop(self._timers)
+                    if not timer.cancelled:
+                        self._events.append(Event(timer.kind, timer.data, due))
+                        self.timers_fired += 1
+                if self._events:
+                    return self._events.popleft()
+
+                wait = self._timers[0][0] - now if self._timers else None
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._cond.wait(wait)
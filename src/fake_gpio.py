@@ -0,0 +1,172 @@
+# fake_gpio.py
+"""
+In-memory stand-in for the subset of RPi.GPIO used by this project, so the
+servo and door logic can run (and be timed) on a plain Linux box.
+
+FakeGPIO records pin writes and PWM duty-cycle changes with
+time.monotonic() timestamps instead of touching hardware. Edge callbacks
+(add_event_detect) are queued and run in order on one callback thread, like
+RPi.GPIO's, so they can run after the pin has changed again. With
+edge_timestamps they also get the edge's time.monotonic_ns() capture time
+as a second argument, like lgpio alerts; without, they get only the pin,
+like RPi.GPIO. replay_echo() turns trigger pulses into recorded ultrasonic
+echo pulses.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+
+class FakePWM:
+    def __init__(self, gpio: "FakeGPIO", pin: int, frequency: float):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = 0.0
+        self.running = False
+        self.history = []         # (monotonic time, duty cycle)
+
+    def start(self, duty: float) -> None:
+        self.running = True
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty: float) -> None:
+        self.duty = duty
+        self.history.append((time.monotonic(), duty))
+
+    def ChangeFrequency(self, frequency: float) -> None:
+        self.frequency = frequency
+
+    def stop(self) -> None:
+        self.running = False
+
+
+class FakeGPIO:
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+
+    def __init__(self, edge_timestamps: bool = True):
+        """
+        :param edge_timestamps: pass capture timestamps to edge callbacks
+        """
+        self.edge_timestamps = edge_timestamps
+        self.mode = None
+        self.pins = {}            # pin -> (direction, level)
+        self.pwms = {}            # pin -> FakePWM
+        self.callbacks = {}       # pin -> (edge, [callback])
+        self.echoes = {}          # trig pin -> (echo pin, deque of pulse widths, delay, loop)
+        self._lock = threading.Lock()
+        self._edges = queue.SimpleQueue()   # (callback, pin, capture time) waiting for the callback thread
+        self._dispatcher = None
+
+    def setwarnings(self, flag: bool) -> None:
+        pass
+
+    def setmode(self, mode: int) -> None:
+        self.mode = mode
+
+    def setup(self, pins, direction: int, initial: int = 0, **kwargs) -> None:
+        for pin in pins if isinstance(pins, (list, tuple)) else [pins]:
+            self.pins[pin] = (direction, initial if direction == self.OUT else self.LOW)
+
+    def output(self, pin: int, value) -> None:
+        with self._lock:
+            old = self.pins.get(pin, (self.OUT, self.LOW))[1]
+            self.pins[pin] = (self.OUT, int(bool(value)))
+        if pin in self.echoes and old and not value:
+            self._fire_echo(pin)
+
+    def input(self, pin: int) -> int:
+        return self.pins.get(pin, (self.IN, self.LOW))[1]
+
+    def add_event_detect(self, pin: int, edge: int, callback=None, bouncetime: int | None = None) -> None:
+        self.callbacks[pin] = (edge, [callback] if callback else [])
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="fake-gpio-callbacks",
+                                                    daemon=True)
+                self._dispatcher.start()
+
+    def _dispatch(self) -> None:
+        while True:
+            cb, pin, tick_ns = self._edges.get()
+            try:
+                if self.edge_timestamps:
+                    cb(pin, tick_ns)
+                else:
+                    cb(pin)
+            except Exception as e:
+                print(f"[fake_gpio] callback error on pin {pin}: {e}")
+
+    def add_event_callback(self, pin: int, callback) -> None:
+        self.callbacks[pin][1].append(callback)
+
+    def remove_event_detect(self, pin: int) -> None:
+        self.callbacks.pop(pin, None)
+
+    def set_input(self, pin: int, level: int, tick_ns: int | None = None) -> None:
+        """
+        Drive an input pin from outside; matching edge callbacks are queued
+        for the callback thread.
+
+        :param tick_ns: time.monotonic_ns() of the edge (default: now)
+        """
+        tick_ns = time.monotonic_ns() if tick_ns is None else tick_ns
+        with self._lock:
+            old = self.pins.get(pin, (self.IN, self.LOW))[1]
+            self.pins[pin] = (self.IN, level)
+        edge, callbacks = self.callbacks.get(pin, (None, []))
+        if old != level and edge in (self.BOTH, self.RISING if level else self.FALLING):
+            for cb in callbacks:
+                self._edges.put((cb, pin, tick_ns))
+
+    def replay_echo(self, trig_pin: int, echo_pin: int, widths, delay: float = 0.0005,
+                    loop: bool = False) -> None:
+        """
+        Answer each trigger pulse on trig_pin with the next recorded echo.
+
+        :param widths: echo pulse widths in seconds; None means no echo
+        :param delay: time from the end of the trigger pulse to the echo
+        :param loop: start over after the last width instead of going silent
+        """
+        self.echoes[trig_pin] = (echo_pin, deque(widths), delay, loop)
+
+    def _fire_echo(self, trig_pin: int) -> None:
+        echo_pin, widths, delay, loop = self.echoes[trig_pin]
+        if not widths:
+            return
+        width = widths.popleft()
+        if loop:
+            widths.append(width)
+        if width is None:
+            return
+
+        # edges carry their nominal times, so sleep overshoot on this thread
+        # delays the callbacks but does not change the recorded pulse
+        rise_ns = time.monotonic_ns() + int(delay * 1e9)
+        fall_ns = rise_ns + int(width * 1e9)
+
+        def pulse():
+            for tick_ns, level in ((rise_ns, self.HIGH), (fall_ns, self.LOW)):
+                time.sleep(max(tick_ns - time.monotonic_ns(), 0) / 1e9)
+                self.set_input(echo_pin, level, tick_ns)
+        threading.Thread(target=pulse, name="fake-echo", daemon=True).start()
+
+    def PWM(self, pin: int, frequency: float) -> FakePWM:
+        pwm = FakePWM(self, pin, frequency)
+        self.pwms[pin] = pwm
+        return pwm
+
+    def cleanup(self, *args) -> None:
+        self.pins.clear()
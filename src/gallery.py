@@ -0,0 +1,290 @@
+# gallery.py
+"""
+GalleryIndex keeps the authorized face embeddings in a single contiguous
+float32 matrix so matching a probe against every enrolled person is one
+matrix product instead of a Python loop.
+
+Rows are L2-normalized when they are added, so cosine similarity reduces to
+a dot product. Readers work on an immutable GallerySnapshot that writers
+replace atomically: matching never takes a lock and never observes a
+half-applied update. add() writes into spare capacity past the end of the
+current snapshot, so appends do not copy the matrix; removals and bulk
+updates build a new matrix. replace() can adopt a read-only (e.g.
+memory-mapped) matrix without copying it.
+
+Images may be stored lazily: any object with a load() method (see
+gallery_store.LazyImage) is only decoded when image() asks for it.
+"""
+import threading
+import numpy as np
+
+_MIN_CAPACITY = 16
+
+
+def entry_key(name: str, meta: dict) -> object:
+    """Identity of an entry for sync purposes: server id if known, else name."""
+    return meta.get("id", name) if meta else name
+
+
+class GallerySnapshot:
+    """
+    Immutable view of the gallery at one point in time.
+    """
+    __slots__ = ("vectors", "names", "images", "metas", "version")
+
+    def __init__(self, vectors: np.ndarray, names: np.ndarray, images: tuple,
+                 metas: tuple, version: int):
+        self.vectors = vectors      # (N, D) normalized, never written through
+        self.names = names          # (N,) object array
+        self.images = images
+        self.metas = metas
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def keys(self) -> list:
+        return [entry_key(n, m) for n, m in zip(self.names, self.metas)]
+
+    def image(self, name: str):
+        """
+        Decoded image of the first entry with this name (None if absent),
+        decoding a lazily stored image on first access.
+        """
+        hits = np.flatnonzero(self.names == name)
+        if not len(hits):
+            return None
+        img = self.images[hits[0]]
+        return img.load() if hasattr(img, "load") else img
+
+    def similarities(self, probes) -> np.ndarray:
+        """
+        Cosine similarity of each probe against every gallery row.
+
+        :param probes: (D,) or (N, D) L2-normalized embeddings
+        :return: (N, size) similarity matrix
+        """
+        q = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        return q @ self.vectors.T
+
+    def match(self, probe) -> tuple[str | None, float]:
+        """
+        Best match for a single normalized embedding.
+
+        :return: (name, similarity), or (None, 0.0) if the gallery is empty
+        """
+        names, sims = self.match_many(probe)
+        return names[0], float(sims[0])
+
+    def match_many(self, probes) -> tuple[list, np.ndarray]:
+        """
+        Best match for each of N normalized embeddings in one matrix product.
+
+        :return: (names, similarities) of length N; name is None when the
+                 gallery is empty
+        """
+        q = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        if len(self.names) == 0:
+            return [None] * len(q), np.zeros(len(q), dtype=np.float32)
+        sims = q @ self.vectors.T
+        best = sims.argmax(axis=1)
+        return list(self.names[best]), sims[np.arange(len(q)), best]
+
+    def topk(self, probe, k: int = 5) -> list[tuple[str, float]]:
+        """
+        The k most similar entries for one normalized embedding, best first.
+        """
+        q = np.asarray(probe, dtype=np.float32).reshape(-1)
+        if len(self.names) == 0:
+            return []
+        sims = self.vectors @ q
+        k = min(k, len(sims))
+        idx = np.argpartition(-sims, k - 1)[:k]
+        idx = idx[np.argsort(-sims[idx])]
+        return [(self.names[i], float(sims[i])) for i in idx]
+
+
+def _normalize_rows(vectors, n: int) -> np.ndarray:
+    vecs = np.array(vectors, dtype=np.float32).reshape(n, -1)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    if n and not norms.all():
+        raise ValueError("zero-norm embedding in gallery")
+    vecs /= np.where(norms > 0, norms, 1.0)
+    return vecs
+
+
+class GalleryIndex:
+    def __init__(self, dim: int | None = None):
+        """
+        :param dim: embedding dimension; inferred from the first add() if None
+        """
+        self.dim = dim
+        self._write_lock = threading.Lock()
+        # append buffers; rows past the current snapshot are invisible to readers
+        self._vectors = np.empty((0, dim or 0), dtype=np.float32)
+        self._names = np.empty(0, dtype=object)
+        self._snap = GallerySnapshot(self._vectors, self._names, (), (), 0)
+
+    def snapshot(self) -> GallerySnapshot:
+        """The current immutable snapshot (lock-free)."""
+        return self._snap
+
+    # ─── Mutation (writers are serialized; readers never wait) ───────────
+    def _publish(self, vectors: np.ndarray, names: np.ndarray, images, metas) -> None:
+        n = len(images)
+        view = vectors[:n]
+        if view.flags.writeable:
+            view = view.view()
+            view.flags.writeable = False
+        self._snap = GallerySnapshot(view, names[:n], tuple(images), tuple(metas),
+                                     self._snap.version + 1)
+
+    def _adopt(self, vectors: np.ndarray, names: np.ndarray) -> None:
+        self._vectors, self._names = vectors, names
+        if len(vectors):
+            self.dim = vectors.shape[1]
+
+    def add(self, name: str, vector, image=None, meta: dict | None = None) -> None:
+        """
+        Normalize and append one embedding.
+
+        :param name: identity label
+        :param vector: embedding (any float sequence)
+        :param image: optional face image (array or lazy loader)
+        :param meta: optional metadata (e.g. server id) kept with the entry
+        """
+        vec = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vec))
+        if norm == 0.0:
+            raise ValueError(f"zero-norm embedding for {name!r}")
+        with self._write_lock:
+            snap = self._snap
+            n = len(snap)
+            if self.dim is None or n == 0:
+                self.dim = vec.size
+            if vec.size != self.dim:
+                raise ValueError(
+                    f"embedding for {name!r} has dim {vec.size}, expected {self.dim}"
+                )
+            # grow (or leave read-only / foreign storage) by copying into a new buffer
+            if (n >= len(self._vectors) or not self._vectors.flags.writeable
+                    or self._vectors.shape[1] != self.dim):
+                cap = max(_MIN_CAPACITY, 2 * n)
+                vectors = np.empty((cap, self.dim), dtype=np.float32)
+                names = np.empty(cap, dtype=object)
+                if n:
+                    vectors[:n] = snap.vectors
+                    names[:n] = snap.names
+                self._adopt(vectors, names)
+            np.divide(vec, norm, out=self._vectors[n])
+            self._names[n] = name
+            self._publish(self._vectors, self._names, snap.images + (image,),
+                          snap.metas + (meta or {},))
+
+    def replace(self, names: list[str], vectors, images: list | None = None,
+                metas: list[dict] | None = None, normalized: bool = False) -> None:
+        """
+        Swap in a complete gallery in one step.
+
+        :param names: N identity labels
+        :param vectors: (N, D) embeddings
+        :param images: optional N images / lazy loaders
+        :param metas: optional N metadata dicts
+        :param normalized: rows are already L2-normalized; the array is then
+                           adopted as-is (no copy), even if read-only
+        """
+        n = len(names)
+        vecs = vectors if normalized else _normalize_rows(vectors, n)
+        name_arr = np.empty(n, dtype=object)
+        name_arr[:] = list(names)
+        images = list(images) if images is not None else [None] * n
+        metas = list(metas) if metas is not None else [{} for _ in range(n)]
+        with self._write_lock:
+            self._adopt(vecs, name_arr)
+            self._publish(vecs, name_arr, images, metas)
+
+    def apply_changes(self, upserts: list[tuple], deletes=()) -> int:
+        """
+        Apply a batch of changes as one new snapshot.
+
+        :param upserts: (name, vector, image, meta) tuples; an existing entry
+                        with the same key (see entry_key) is replaced
+        :param deletes: keys to remove
+        :return: number of entries in the new snapshot
+        """
+        new_keys = [entry_key(u[0], u[3] or {}) for u in upserts]
+        drop = set(deletes) | set(new_keys)
+        new_vecs = _normalize_rows([u[1] for u in upserts], len(upserts)) if upserts else None
+        with self._write_lock:
+            snap = self._snap
+            keep = np.array([k not in drop for k in snap.keys()], dtype=bool)
+            if new_vecs is not None:
+                if not keep.any():
+                    vectors = new_vecs
+                elif new_vecs.shape[1] != snap.vectors.shape[1]:
+                    raise ValueError("embedding dimension changed during sync")
+                else:
+                    vectors = np.concatenate([snap.vectors[keep], new_vecs])
+            else:
+                vectors = np.array(snap.vectors[keep])
+            names = np.empty(len(vectors), dtype=object)
+            names[:] = [n for n, k in zip(snap.names, keep) if k] + [u[0] for u in upserts]
+            images = [i for i, k in zip(snap.images, keep) if k] + [u[2] for u in upserts]
+            metas = [m for m, k in zip(snap.metas, keep) if k] + [u[3] or {} for u in upserts]
+            self._adopt(vectors, names)
+            self._publish(vectors, names, images, metas)
+            return len(names)
+
+    def remove(self, name: str) -> int:
+        """
+        Delete every entry with the given name.
+
+        :return: number of entries removed
+        """
+        with self._write_lock:
+            snap = self._snap
+            keep = snap.names != name
+            removed = len(snap) - int(keep.sum())
+            if removed:
+                vectors = np.array(snap.vectors[keep])
+                names = snap.names[keep]
+                self._adopt(vectors, names)
+                self._publish(vectors, names,
+                              [i for i, k in zip(snap.images, keep) if k],
+                              [m for m, k in zip(snap.metas, keep) if k])
+            return removed
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self.replace([], np.empty((0, self.dim or 0), dtype=np.float32), normalized=True)
+
+    # ─── Queries (delegate to the current snapshot) ──────────────────────
+    def __len__(self) -> int:
+        return len(self._snap)
+
+    def names(self) -> list[str]:
+        return list(self._snap.names)
+
+    def image(self, name: str):
+        return self._snap.image(name)
+
+    def export(self) -> tuple[list[str], np.ndarray, list, list[dict]]:
+        """
+        Consistent copy of (names, normalized vectors, images, metas), e.g. for
+        persisting to disk.
+        """
+        snap = self._snap
+        return (list(snap.names), np.array(snap.vectors), list(snap.images),
+                [dict(m) for m in snap.metas])
+
+    def similarities(self, probes) -> np.ndarray:
+        return self._snap.similarities(probes)
+
+    def match(self, probe) -> tuple[str | None, float]:
+        return self._snap.match(probe)
+
+    def match_many(self, probes) -> tuple[list, np.ndarray]:
+        return self._snap.match_many(probes)
+
+    def topk(self, probe, k: int = 5) -> list[tuple[str, float]]:
+        return self._snap.topk(probe, k)
@@ -0,0 +1,274 @@
+# gallery_store.py
+"""
+Versioned on-disk cache of the authorized gallery, so the recognizer can start
+matching immediately at boot and reconcile with the server afterwards.
+
+Layout of GALLERY_CACHE_DIR:
+- index.json            format/version, embedding dim, names and per-entry
+                        metadata, plus the server sync cursor
+- embeddings-<v>.npy    (N, D) float32 normalized embeddings, loaded memory-mapped
+- images/<sha1>.jpg     encoded face images, decoded only when requested
+
+A new version is written next to the old one and index.json is swapped with an
+atomic rename, so a crash mid-save leaves the previous cache intact. Saves are
+serialized by a module-level lock; request_save() hands them to a background
+writer that coalesces bursts of changes into one save.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+
+from config import GALLERY_CACHE_DIR
+from gallery import GalleryIndex
+
+_FORMAT = 1
+_INDEX = "index.json"
+_IMAGES = "images"
+
+# one save at a time: every save rewrites index.json and prunes files the
+# others may still reference
+_SAVE_LOCK = threading.Lock()
+
+
+class LazyImage:
+    """
+    Encoded face image that is only decoded on the first load() call.
+    Holds either the encoded bytes or a path to them.
+    """
+    __slots__ = ("data", "path", "_decoded")
+
+    def __init__(self, data: bytes | None = None, path: str | None = None):
+        self.data = data
+        self.path = path
+        self._decoded = None
+
+    def encoded(self) -> bytes | None:
+        if self.data is None and self.path:
+            try:
+                with open(self.path, "rb") as f:
+                    return f.read()
+            except OSError:
+                return None
+        return self.data
+
+    def load(self) -> np.ndarray | None:
+        if self._decoded is None:
+            raw = self.encoded()
+            if raw:
+                self._decoded = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+        return self._decoded
+
+
+def _write_atomic(path: str, write) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".",
+                               suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        _silent_remove(tmp)
+        raise
+
+
+def _encode_image(img) -> bytes | None:
+    if img is None:
+        return None
+    if isinstance(img, LazyImage):
+        return img.encoded()
+    ok, buf = cv2.imencode(".jpg", img)
+    return buf.tobytes() if ok else None
+
+
+def save_gallery(gallery: GalleryIndex, cache_dir: str = GALLERY_CACHE_DIR,
+                 sync_state: dict | None = None) -> int | None:
+    """
+    Persist the gallery as a new cache version.
+
+    :param sync_state: server sync cursor to store; the previous one is kept if None
+    :return: the version written, or None on failure
+    """
+    with _SAVE_LOCK:
+        return _save(gallery, cache_dir, sync_state)
+
+
+def _save(gallery: GalleryIndex, cache_dir: str, sync_state: dict | None) -> int | None:
+    names, vectors, images, metas = gallery.export()
+    try:
+        os.makedirs(os.path.join(cache_dir, _IMAGES), exist_ok=True)
+        old = _read_index(cache_dir)
+        version = (old or {}).get("version", 0) + 1
+
+        entries, keep_images = [], set()
+        for name, img, meta in zip(names, images, metas):
+            rel = None
+            raw = _encode_image(img)
+            if raw:
+                rel = os.path.join(_IMAGES, hashlib.sha1(raw).hexdigest() + ".jpg")
+                full = os.path.join(cache_dir, rel)
+                if not os.path.exists(full):
+                    _write_atomic(full, lambda f, raw=raw: f.write(raw))
+                keep_images.add(os.path.basename(rel))
+            entries.append({"name": name, "image": rel, "meta": meta})
+
+        emb_file = f"embeddings-{version}.npy"
+        _write_atomic(os.path.join(cache_dir, emb_file),
+                      lambda f: np.save(f, vectors.astype(np.float32, copy=False)))
+        index = {
+            "format": _FORMAT,
+            "version": version,
+            "saved_at": time.time(),
+            "dim": int(vectors.shape[1]) if len(vectors) else gallery.dim,
+            "embeddings": emb_file,
+            "entries": entries,
+            "sync": sync_state if sync_state is not None else (old or {}).get("sync", {}),
+        }
+        _write_atomic(os.path.join(cache_dir, _INDEX),
+                      lambda f: f.write(json.dumps(index).encode("utf-8")))
+    except OSError as e:
+        print(f"[gallery_store] Failed to save gallery cache: {e}")
+        return None
+
+    # best-effort cleanup of superseded files
+    for fname in os.listdir(cache_dir):
+        if fname.startswith("embeddings-") and fname != emb_file:
+            _silent_remove(os.path.join(cache_dir, fname))
+    for fname in os.listdir(os.path.join(cache_dir, _IMAGES)):
+        if fname not in keep_images:
+            _silent_remove(os.path.join(cache_dir, _IMAGES, fname))
+    return version
+
+
+class GallerySaver(threading.Thread):
+    """
+    Background writer for the gallery cache. request() only marks a gallery
+    dirty, so callers on latency-sensitive threads (websocket receive,
+    enrollment workers) never wait for disk; requests that arrive while a
+    save is running are coalesced into the next one.
+    """
+    def __init__(self):
+        super().__init__(name="gallery-saver", daemon=True)
+        self._cond = threading.Condition()
+        # (id(gallery), cache_dir) -> [gallery, cache_dir, sync_state]
+        self._dirty: dict[tuple, list] = {}
+        self._busy = False
+        self.saves = 0
+        self.coalesced = 0
+
+    def request(self, gallery: GalleryIndex, cache_dir: str = GALLERY_CACHE_DIR,
+                sync_state: dict | None = None) -> None:
+        """
+        Mark `gallery` dirty. A sync_state is kept until it is written, even
+        if later requests for the same gallery pass none.
+        """
+        with self._cond:
+            key = (id(gallery), cache_dir)
+            pending = self._dirty.get(key)
+            if pending is None:
+                self._dirty[key] = [gallery, cache_dir, sync_state]
+            else:
+                self.coalesced += 1
+                if sync_state is not None:
+                    pending[2] = sync_state
+            self._cond.notify()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Wait until every pending save has been written.
+
+        :return: False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._dirty and not self._busy, timeout)
+
+    def run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty)
+                batch = list(self._dirty.values())
+                self._dirty.clear()
+                self._busy = True
+            for gallery, cache_dir, sync_state in batch:
+                try:
+                    save_gallery(gallery, cache_dir, sync_state)
+                    self.saves += 1
+                except Exception as e:
+                    print(f"[gallery_store] Background save failed: {e}")
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+
+_SAVER: GallerySaver | None = None
+_SAVER_LOCK = threading.Lock()
+
+
+def get_gallery_saver() -> GallerySaver:
+    """Return the shared background writer, starting it on first use."""
+    global _SAVER
+    with _SAVER_LOCK:
+        if _SAVER is None:
+            _SAVER = GallerySaver()
+            _SAVER.start()
+        return _SAVER
+
+
+def request_save(gallery: GalleryIndex, cache_dir: str = GALLERY_CACHE_DIR,
+                 sync_state: dict | None = None) -> None:
+    """Schedule a background save of `gallery` (see GallerySaver)."""
+    get_gallery_saver().request(gallery, cache_dir, sync_state)
+
+
+def load_gallery(gallery: GalleryIndex, cache_dir: str = GALLERY_CACHE_DIR) -> bool:
+    """
+    Load the cached gallery into `gallery`, memory-mapping the embeddings and
+    deferring image decoding.
+
+    :return: True if a valid cache was loaded
+    """
+    index = _read_index(cache_dir)
+    if not index or index.get("format") != _FORMAT:
+        return False
+    try:
+        vectors = np.load(os.path.join(cache_dir, index["embeddings"]), mmap_mode="r")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[gallery_store] Ignoring unreadable gallery cache: {e}")
+        return False
+    entries = index.get("entries", [])
+    if len(entries) != len(vectors):
+        print("[gallery_store] Ignoring inconsistent gallery cache")
+        return False
+
+    images = [LazyImage(path=os.path.join(cache_dir, e["image"])) if e.get("image") else None
+              for e in entries]
+    gallery.replace([e["name"] for e in entries], vectors, images,
+                    [e.get("meta", {}) for e in entries], normalized=True)
+    print(f"[gallery_store] Loaded {len(entries)} cached faces (version {index['version']})")
+    return True
+
+
+def load_sync_state(cache_dir: str = GALLERY_CACHE_DIR) -> dict:
+    """Server sync cursor stored with the cache ({} if none)."""
+    return (_read_index(cache_dir) or {}).get("sync", {})
+
+
+def _read_index(cache_dir: str) -> dict | None:
+    try:
+        with open(os.path.join(cache_dir, _INDEX), "rb") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _silent_remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,178 @@
+# gallery_sync.py
+"""
+GallerySyncThread keeps GALLERY in step with the server in the background.
+
+- Incremental syncs request only entries changed since the last cursor
+  (GALLERY_SYNC_CURSOR_PARAM=<max updated_at seen>, with If-Modified-Since)
+  and follow "next" links for pagination.
+- A periodic full sync (with If-None-Match on the last ETag) catches
+  deletions the server cannot report incrementally.
+
+Every result is parsed off the recognition path and published to GALLERY as
+one new snapshot, so matching never sees a half-applied update. The cursor is
+persisted with the gallery cache so a restart resumes incrementally.
+"""
+import base64
+import threading
+import time
+import numpy as np
+import requests
+
+from config import (
+    FACE_DATA_URL,
+    GALLERY_SYNC_INTERVAL_S,
+    GALLERY_FULL_SYNC_S,
+    GALLERY_SYNC_CURSOR_PARAM,
+    GALLERY_SYNC_MAX_PAGES,
+)
+from gallery import GalleryIndex, entry_key
+from gallery_store import LazyImage, load_sync_state, request_save
+from http_client import get_http_client
+
+
+def parse_face_entry(entry: dict):
+    """
+    Parse one server face-vector entry.
+
+    :return: (name, vector, image, meta), or None if the entry is unusable
+    """
+    name = entry.get("name")
+    vec  = entry.get("vector_data", entry.get("face_vector", []))
+    face_b64 = entry.get("face_image_base64")
+    img = None
+    if face_b64:
+        try:
+            if face_b64.startswith("data:image"):
+                face_b64 = face_b64.split(",", 1)[1]
+            img = LazyImage(data=base64.b64decode(face_b64))
+        except Exception as ex:
+            print(f"[gallery_sync] Skipping invalid face image for {name}: {ex}")
+    meta = {k: entry[k] for k in ("id", "updated_at") if entry.get(k) is not None}
+    if not name or not isinstance(vec, list):
+        return None
+    try:
+        arr = np.asarray(vec, dtype=np.float32)
+    except (TypeError, ValueError):
+        arr = None
+    if arr is None or arr.ndim != 1 or not np.isfinite(arr).all() or not arr.any():
+        print(f"[gallery_sync] Skipping invalid vector for {name}")
+        return None
+    return name, arr, img, meta
+
+
+def _is_deleted(entry: dict) -> bool:
+    return bool(entry.get("deleted") or entry.get("is_deleted")) or entry.get("is_active") is False
+
+
+class GallerySyncThread(threading.Thread):
+    def __init__(self, gallery: GalleryIndex, url: str = FACE_DATA_URL):
+        super().__init__(name="gallery-sync", daemon=True)
+        self.gallery = gallery
+        self.url = url
+        self.state = load_sync_state()   # etag, last_modified, cursor, last_full
+        self._wake = threading.Event()
+        self.syncs = 0
+        self.failures = 0
+
+    def trigger(self) -> None:
+        """Run the next sync immediately."""
+        self._wake.set()
+
+    def run(self):
+        while True:
+            try:
+                self.sync_once()
+                self.syncs += 1
+            except (requests.RequestException, ValueError) as e:
+                self.failures += 1
+                print(f"[gallery_sync] Sync failed: {e}")
+            self._wake.wait(GALLERY_SYNC_INTERVAL_S)
+            self._wake.clear()
+
+    def _fetch_pages(self, params: dict, headers: dict):
+        """
+        GET the listing and follow pagination.
+
+        :return: (entries, first_response), or (None, response) on 304
+        """
+        http = get_http_client()
+        resp = http.get(self.url, "gallery_sync", params=params, headers=headers)
+        if resp.status_code == 304:
+            return None, resp
+        resp.raise_for_status()
+        first = resp
+        entries = []
+        for _ in range(GALLERY_SYNC_MAX_PAGES):
+            data = resp.json()
+            if isinstance(data, dict):
+                entries.extend(data.get("results") or [])
+                next_url = data.get("next")
+            else:
+                entries.extend(data or [])
+                next_url = None
+            if not next_url:
+                break
+            resp = http.get(next_url, "gallery_sync")
+            resp.raise_for_status()
+        return entries, first
+
+    def sync_once(self) -> bool:
+        """
+        Run one full or incremental sync.
+
+        :return: True if the gallery changed
+        """
+        cursor = self.state.get("cursor")
+        full = not cursor or time.time() - self.state.get("last_full", 0) >= GALLERY_FULL_SYNC_S
+        params, headers = {}, {}
+        if full:
+            if self.state.get("etag") and len(self.gallery):
+                headers["If-None-Match"] = self.state["etag"]
+        else:
+            params[GALLERY_SYNC_CURSOR_PARAM] = cursor
+            if self.state.get("last_modified"):
+                headers["If-Modified-Since"] = self.state["last_modified"]
+
+        entries, resp = self._fetch_pages(params, headers)
+        if full:
+            self.state["last_full"] = time.time()
+        if entries is None:
+            return False
+
+        changes, deletes = {}, set()
+        for entry in entries:
+            if entry.get("updated_at") and (cursor is None or entry["updated_at"] > cursor):
+                cursor = entry["updated_at"]
+            key = entry_key(entry.get("name"), entry)
+            if _is_deleted(entry):
+                deletes.add(key)
+                changes.pop(key, None)
+                continue
+            parsed = parse_face_entry(entry)
+            if parsed is not None:
+                changes[key] = parsed    # later pages win
+        upserts = list(changes.values())
+
+        if full:
+            # entries whose dimension disagrees with the first one are dropped
+            dim = upserts[0][1].size if upserts else 0
+            upserts = [u for u in upserts if u[1].size == dim]
+            vectors = np.stack([u[1] for u in upserts]) if upserts else np.empty((0, dim), np.float32)
+            self.gallery.replace([u[0] for u in upserts], vectors,
+                                 [u[2] for u in upserts], [u[3] for u in upserts])
+            self.state["etag"] = resp.headers.get("ETag")
+            changed = True
+        else:
+            changed = bool(upserts or deletes)
+            if changed:
+                self.gallery.apply_changes(upserts, deletes)
+        if resp.headers.get("Last-Modified"):
+            self.state["last_modified"] = resp.headers["Last-Modified"]
+        self.state["cursor"] = cursor
+
+        if changed:
+            kind = "full" if full else "incremental"
+            print(f"[gallery_sync] {kind} sync: {len(upserts)} updated, {len(deletes)} deleted, "
+                  f"{len(self.gallery)} faces")
+            request_save(self.gallery, sync_state=dict(self.state))
+        return changed
@@ -0,0 +1,79 @@
+# hal.py
+"""
+Hardware abstraction: picks the camera, GPIO and model backends from config,
+so the full pipeline can run on a Pi or on a plain Linux box.
+
+- CAMERA_BACKEND: "picamera2", "video" (CAMERA_SOURCE is a video file) or
+  "images" (CAMERA_SOURCE is a directory of images)
+- GPIO_BACKEND:   "rpi" (RPi.GPIO) or "fake" (fake_gpio.FakeGPIO with a
+  simulated servo and an ultrasonic sensor replaying ULTRASONIC_SIM_DISTANCES_CM)
+- MODEL_BACKEND:  "degirum" (Hailo via PySDK) or "replay" (real
+  postprocessors on recorded tensors, see replay_models)
+
+Hardware packages are only imported when their backend is selected.
+"""
+import threading
+
+from config import (
+    CAMERA_BACKEND,
+    CAMERA_SOURCE,
+    GPIO_BACKEND,
+    MODEL_BACKEND,
+    MODEL_REPLAY_DIR,
+    INFERENCE_HOST,
+    ZOO_URL,
+    ULTRASONIC_TRIG_PIN,
+    ULTRASONIC_ECHO_PIN,
+    ULTRASONIC_SIM_DISTANCES_CM,
+)
+
+_GPIO = None
+_GPIO_LOCK = threading.Lock()
+
+
+def get_gpio():
+    """
+    The GPIO module for the configured backend (one shared instance, so the
+    servo and the ultrasonic sensor see the same fake pins).
+    """
+    global _GPIO
+    with _GPIO_LOCK:
+        if _GPIO is None:
+            if GPIO_BACKEND == "fake":
+                from fake_gpio import FakeGPIO
+                _GPIO = FakeGPIO()
+                # echo width for a distance d: 2 * d / speed of sound
+                _GPIO.replay_echo(ULTRASONIC_TRIG_PIN, ULTRASONIC_ECHO_PIN,
+                                  [2 * d / 34300 for d in ULTRASONIC_SIM_DISTANCES_CM], loop=True)
+            elif GPIO_BACKEND == "rpi":
+                import RPi.GPIO
+                _GPIO = RPi.GPIO
+            else:
+                raise ValueError(f"unknown GPIO_BACKEND {GPIO_BACKEND!r}")
+        return _GPIO
+
+
+def create_camera():
+    """A new (not yet started) camera thread for the configured backend."""
+    if CAMERA_BACKEND == "picamera2":
+        from camera import CameraThread
+        return CameraThread()
+    if CAMERA_BACKEND in ("video", "images"):
+        from camera import FileCameraThread
+        return FileCameraThread(CAMERA_SOURCE)
+    raise ValueError(f"unknown CAMERA_BACKEND {CAMERA_BACKEND!r}")
+
+
+def load_model(model_name: str):
+    """Load a model for the configured backend."""
+    if MODEL_BACKEND == "replay":
+        from replay_models import ReplayModel
+        return ReplayModel(model_name, ZOO_URL, MODEL_REPLAY_DIR)
+    if MODEL_BACKEND == "degirum":
+        import degirum as dg
+        return dg.load_model(
+            model_name             = model_name,
+            inference_host_address = INFERENCE_HOST,
+            zoo_url                = ZOO_URL
+        )
+    raise ValueError(f"unknown MODEL_BACKEND {MODEL_BACKEND!r}")
@@ -0,0 +1,147 @@
+# http_client.py
+"""
+Shared HTTP client for all server calls (gallery sync, notifier, enrollment
+uploads).
+
+One requests.Session with a pooled HTTPAdapter keeps connections to the
+server alive instead of opening a new TCP connection per request. Each call
+names its endpoint, which selects the timeout (HTTP_TIMEOUTS) and whether a
+large JSON body is gzip-compressed (HTTP_GZIP_ENDPOINTS), and is counted in
+per-endpoint latency statistics (see stats()), which are also exported on
+/metrics (metrics.py) as http_requests_total, http_request_errors_total and
+the http_request_seconds summary.
+
+Errors are raised as requests exceptions, exactly as with module-level
+requests.get/post.
+"""
+import gzip
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import METRICS
+
+from config import (
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_SIZE,
+    HTTP_DEFAULT_TIMEOUT,
+    HTTP_TIMEOUTS,
+    HTTP_GZIP_ENDPOINTS,
+    HTTP_GZIP_MIN_BYTES,
+)
+
+
+class EndpointStats:
+    __slots__ = ("count", "errors", "total_s", "max_s", "last_s")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.last_s = 0.0
+
+    def record(self, elapsed: float, ok: bool) -> None:
+        self.count += 1
+        self.errors += not ok
+        self.total_s += elapsed
+        self.last_s = elapsed
+        self.max_s = max(self.max_s, elapsed)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(1000 * self.total_s / self.count, 1) if self.count else 0.0,
+            "max_ms": round(1000 * self.max_s, 1),
+            "last_ms": round(1000 * self.last_s, 1),
+        }
+
+
+class HttpClient:
+    def __init__(self, pool_connections: int = HTTP_POOL_CONNECTIONS, pool_size: int = HTTP_POOL_SIZE):
+        """
+        :param pool_connections: number of hosts to keep pools for
+        :param pool_size: keep-alive connections per host (one per concurrent caller)
+        """
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._stats: dict[str, EndpointStats] = {}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, endpoint: str = "default", json_body=None,
+                timeout=None, **kwargs) -> requests.Response:
+        """
+        Send one request through the pooled session.
+
+        :param endpoint: name used for timeouts, gzip and statistics
+        :param json_body: JSON-serializable body (gzip-compressed for
+                          HTTP_GZIP_ENDPOINTS once larger than HTTP_GZIP_MIN_BYTES)
+        :param timeout: overrides the endpoint timeout
+        :return: the response (status is not checked)
+        """
+        if timeout is None:
+            timeout = HTTP_TIMEOUTS.get(endpoint, HTTP_DEFAULT_TIMEOUT)
+        if json_body is not None:
+            body = json.dumps(json_body).encode("utf-8")
+            headers = dict(kwargs.pop("headers", None) or {})
+            headers["Content-Type"] = "application/json"
+            if endpoint in HTTP_GZIP_ENDPOINTS and len(body) >= HTTP_GZIP_MIN_BYTES:
+                body = gzip.compress(body, compresslevel=5)
+                headers["Content-Encoding"] = "gzip"
+            kwargs["data"], kwargs["headers"] = body, headers
+
+        start = time.monotonic()
+        ok = False
+        try:
+            resp = self.session.request(method, url, timeout=timeout, **kwargs)
+            ok = resp.status_code < 500
+            return resp
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                st = self._stats.get(endpoint)
+                if st is None:
+                    st = self._stats[endpoint] = self._register(endpoint)
+                st.record(elapsed, ok)
+            METRICS.observe("http_request_seconds", elapsed, endpoint=endpoint)
+
+    @staticmethod
+    def _register(endpoint: str) -> EndpointStats:
+        """New statistics for an endpoint, with its counters exported on /metrics."""
+        st = EndpointStats()
+        METRICS.counter_fn("http_requests", lambda: st.count, endpoint=endpoint)
+        METRICS.counter_fn("http_request_errors", lambda: st.errors, endpoint=endpoint)
+        return st
+
+    def get(self, url: str, endpoint: str = "default", **kwargs) -> requests.Response:
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: str = "default", json=None, **kwargs) -> requests.Response:
+        return self.request("POST", url, endpoint, json_body=json, **kwargs)
+
+    def stats(self) -> dict:
+        """Per-endpoint request count, error count and latency (ms)."""
+        with self._lock:
+            return {name: st.as_dict() for name, st in self._stats.items()}
+
+
+METRICS.describe("http_requests", "HTTP requests sent, by endpoint")
+METRICS.describe("http_request_errors", "HTTP requests that failed or got a 5xx response, by endpoint")
+METRICS.describe("http_request_seconds", "HTTP request latency, by endpoint")
+
+_CLIENT: HttpClient | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Return the process-wide HttpClient."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = HttpClient()
+        return _CLIENT
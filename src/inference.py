@@ -0,0 +1,83 @@
+# inference.py
+"""
+Process-wide inference service owning the single loaded SCRFD detector and
+ArcFace recognizer. The live recognizer and websocket enrollment share it, so
+enrollment costs one inference instead of a model load.
+
+Each model has its own lock: calls to the same model are serialized (the
+DeGirum model objects are not safe for concurrent use), while detection and
+embedding from different threads can still overlap on the Hailo device.
+"""
+import threading
+import numpy as np
+
+from config import FACE_DET_MODEL, FACE_REC_MODEL, FACE_DET_INPUT_SIZE
+from hal import load_model
+from utils import align_and_crop, detections_to_arrays, embedding_from_results, letterbox
+
+
+class InferenceService:
+    def __init__(self):
+        # Load models (Hailo or replay, see hal.MODEL_BACKEND)
+        self.face_det = load_model(FACE_DET_MODEL)
+        self.face_rec = load_model(FACE_REC_MODEL)
+        self._det_lock = threading.Lock()
+        self._rec_lock = threading.Lock()
+
+    def detect(self, img: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Detect faces in an image of any size.
+
+        :return: boxes (N, 4), scores (N,), landmarks (N, 5, 2) in img coordinates
+        """
+        det_img, scale, pad = letterbox(img, FACE_DET_INPUT_SIZE)
+        with self._det_lock:
+            results = self.face_det(det_img).results
+        return detections_to_arrays(results, scale, pad)
+
+    def embed(self, faces: list[np.ndarray]) -> np.ndarray:
+        """
+        Embed aligned face crops with one batched ArcFace call.
+
+        :param faces: list of aligned 112x112 crops
+        :return: (N, D) array of L2-normalized embeddings; rows for which the
+                 model returned no data are all zeros
+        """
+        if not faces:
+            return np.empty((0, 0), dtype=np.float32)
+        with self._rec_lock:
+            rows = [embedding_from_results(res.results) for res in self.face_rec.predict_batch(faces)]
+        dim = next((len(r) for r in rows if r is not None), 0)
+        embs = np.zeros((len(rows), dim), dtype=np.float32)
+        for i, r in enumerate(rows):
+            if r is not None:
+                embs[i] = r
+        return embs
+
+    def detect_and_embed(self, img: np.ndarray, max_faces: int | None = None):
+        """
+        Detect, align and embed the faces in one image.
+
+        :param max_faces: only embed the highest-scoring N faces
+        :return: (boxes, scores, landmarks, faces, embs) for the embedded faces
+        """
+        boxes, scores, landmarks = self.detect(img)
+        if max_faces is not None:
+            boxes, scores, landmarks = boxes[:max_faces], scores[:max_faces], landmarks[:max_faces]
+        faces = [align_and_crop(img, pts) for pts in landmarks]
+        return boxes, scores, landmarks, faces, self.embed(faces)
+
+
+_SERVICE: InferenceService | None = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_inference_service() -> InferenceService:
+    """
+    Return the shared InferenceService, loading the models on first use.
+    """
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _SERVICE = InferenceService()
+        return _SERVICE
@@ -0,0 +1,271 @@
+# metrics.py
+"""
+Latency tracing and counters for the capture -> door path.
+
+- Trace: per-frame context with monotonic timestamps per stage, created at
+  capture and marked by each pipeline stage (and, for recognition events, by
+  the main loop up to the door command). finish() records the time spent in
+  every stage since the previous finish into rolling histograms.
+- METRICS: registry of counters (incremented here, or kept elsewhere and
+  sampled at scrape time), rolling-window histograms (p50/p95/p99 over the
+  last METRICS_WINDOW samples) and gauges sampled at scrape time.
+- start_metrics_server(): Prometheus text format on http://host:port/metrics.
+- METRICS_TRACE_FILE: optional JSONL file with one line per finished event
+  trace (and per frame with METRICS_TRACE_ALL_FRAMES).
+"""
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+import numpy as np
+
+from config import METRICS_WINDOW, METRICS_TRACE_FILE, METRICS_TRACE_ALL_FRAMES, METRICS_HOST, METRICS_PORT
+
+_PREFIX = "facedoor_"
+_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """Recent samples for quantiles plus cumulative count and sum."""
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.samples = deque(maxlen=max(1, window))
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, qs=_QUANTILES) -> list[float]:
+        if not self.samples:
+            return [float("nan")] * len(qs)
+        return list(np.quantile(np.fromiter(self.samples, dtype=np.float64), qs))
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Metrics:
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._histograms: dict[tuple, RollingHistogram] = {}
+        self._gauges: dict[tuple, Callable[[], float]] = {}
+        self._counter_fns: dict[tuple, Callable[[], float]] = {}
+        self._help: dict[str, str] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = RollingHistogram(self.window)
+            hist.observe(seconds)
+
+    def gauge(self, name: str, fn: Callable[[], float], **labels) -> None:
+        """Register a value sampled at scrape time (e.g. a queue depth)."""
+        with self._lock:
+            self._gauges[self._key(name, labels)] = fn
+
+    def counter_fn(self, name: str, fn: Callable[[], float], **labels) -> None:
+        """Register a count kept elsewhere (e.g. a queue's drops), sampled at scrape time."""
+        with self._lock:
+            self._counter_fns[self._key(name, labels)] = fn
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def summary(self, name: str, **labels) -> dict | None:
+        """Quantiles, count and sum of one histogram (None if never observed)."""
+        with self._lock:
+            hist = self._histograms.get(self._key(name, labels))
+            if hist is None:
+                return None
+            qs = hist.quantiles()
+            return {"p50": qs[0], "p95": qs[1], "p99": qs[2], "count": hist.count, "sum": hist.total}
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = list(self._counters.items())
+            counter_fns = list(self._counter_fns.items())
+            hists = sorted(self._histograms.items(), key=lambda kv: kv[0])
+            hists = [(k, h.quantiles(), h.count, h.total) for k, h in hists]
+            gauges = sorted(self._gauges.items(), key=lambda kv: kv[0])
+        lines, typed = [], set()
+
+        def header(name: str, kind: str, family: str) -> None:
+            # HELP and TYPE name the family as its samples do (counters: <name>_total)
+            if family not in typed:
+                typed.add(family)
+                if name in self._help:
+                    lines.append(f"# HELP {_PREFIX}{family} {self._help[name]}")
+                lines.append(f"# TYPE {_PREFIX}{family} {kind}")
+
+        def sample(fn: Callable[[], float]) -> float | None:
+            try:
+                return float(fn())
+            except Exception:
+                return None
+
+        counters += [(key, sample(fn)) for key, fn in counter_fns]
+        for (name, labels), value in sorted(counters, key=lambda kv: kv[0]):
+            if value is None:
+                continue
+            header(name, "counter", f"{name}_total")
+            lines.append(f"{_PREFIX}{name}_total{_labels(dict(labels))} {value:g}")
+        for (name, labels), fn in gauges:
+            value = sample(fn)
+            if value is None:
+                continue
+            header(name, "gauge", name)
+            lines.append(f"{_PREFIX}{name}{_labels(dict(labels))} {value:g}")
+        for (name, labels), qs, count, total in hists:
+            header(name, "summary", name)
+            for q, v in zip(_QUANTILES, qs):
+                lines.append(f"{_PREFIX}{name}{_labels(dict(labels, quantile=q))} {v:.6f}")
+            lines.append(f"{_PREFIX}{name}_count{_labels(dict(labels))} {count}")
+            lines.append(f"{_PREFIX}{name}_sum{_labels(dict(labels))} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+METRICS.describe("stage_latency_seconds", "Time spent in each pipeline stage")
+METRICS.describe("end_to_end_seconds", "Capture to end of processing, per outcome")
+METRICS.describe("frames_captured", "Frames published by the camera")
+METRICS.describe("frames_dropped", "Frames not processed, by reason")
+METRICS.describe("frames_detected", "Frames with at least one face")
+METRICS.describe("faces_detected", "Faces detected")
+METRICS.describe("faces_embedded", "Face crops sent through ArcFace")
+
+
+class TraceWriter:
+    """Appends finished traces to a JSONL file from any thread."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"[metrics] Failed to write trace: {e}")
+
+
+_WRITER = TraceWriter(METRICS_TRACE_FILE) if METRICS_TRACE_FILE else None
+
+
+class Trace:
+    """
+    Stage timestamps of one frame; stage durations are measured from the
+    previous mark.
+    """
+    __slots__ = ("seq", "start", "marks", "_done")
+
+    def __init__(self, seq: int, captured: float):
+        """
+        :param seq: camera sequence number
+        :param captured: time.monotonic() of the capture
+        """
+        self.seq = seq
+        self.start = captured
+        self.marks = [("capture", captured)]
+        self._done = 1
+
+    def mark(self, stage: str, t: float | None = None) -> float:
+        """Record the end of `stage` (now, unless t is given)."""
+        t = time.monotonic() if t is None else t
+        self.marks.append((stage, t))
+        return t
+
+    def copy(self) -> "Trace":
+        """Independent trace with the same marks, e.g. one per event of a frame."""
+        other = Trace(self.seq, self.start)
+        other.marks = list(self.marks)
+        other._done = self._done
+        return other
+
+    def stages(self) -> dict[str, float]:
+        """Duration of every marked stage in seconds."""
+        return {stage: t - prev for (_, prev), (stage, t) in zip(self.marks, self.marks[1:])}
+
+    def finish(self, outcome: str = "frame", event: bool = False, metrics: Metrics = METRICS) -> None:
+        """
+        Record the stages marked since the previous finish() and the
+        end-to-end latency for this outcome. A trace may be finished again
+        after more marks (e.g. a frame, then the door command it caused).
+
+        :param event: the trace ends in an event (written to the trace file)
+        """
+        new = self.marks[self._done - 1:]
+        for (_, prev), (stage, t) in zip(new, new[1:]):
+            metrics.observe("stage_latency_seconds", t - prev, stage=stage)
+        self._done = len(self.marks)
+        total = self.marks[-1][1] - self.start
+        metrics.observe("end_to_end_seconds", total, outcome=outcome)
+        if _WRITER is not None and (event or METRICS_TRACE_ALL_FRAMES):
+            _WRITER.write({
+                "seq": self.seq,
+                "outcome": outcome,
+                "wall_time": time.time(),
+                "stages_ms": {k: round(v * 1000, 3) for k, v in self.stages().items()},
+                "total_ms": round(total * 1000, 3),
+            })
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> ThreadingHTTPServer | None:
+    """
+    Serve METRICS at http://host:port/metrics from a daemon thread.
+
+    :return: the server, or None if the port is unavailable
+    """
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"[metrics] Cannot serve metrics on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"[metrics] Serving http://{host}:{server.server_port}/metrics")
+    return server
@@ -11,6 +11,11 @@ class PostProcessor:
         Parameters:
             json_config (str): JSON string containing post-processing configuration.
         """
+        config = json.loads(json_config)
+        post_process = config.get("POST_PROCESS", [{}])[0]
+        # Opt-in: return the float32 array itself, L2-normalized, instead of
+        # a nested Python list
+        self.normalized_array = bool(post_process.get("OutputNormalizedArray", False))
 
     def forward(self, tensor_list, details_list):
         """
@@ -28,6 +33,28 @@ class PostProcessor:
         for data, tensor_info in zip(tensor_list, details_list):
             # Dequantize the tensor
             quantization = tensor_info["quantization"]
+            if self.normalized_array:
+                # dequantize into one float32 buffer and normalize in place
+                reshaped_data = data.astype(np.float32).reshape(1, -1)
+                reshaped_data -= np.float32(np.ravel(quantization[1])[0])
+                reshaped_data *= np.float32(np.ravel(quantization[0])[0])
+                norm = np.linalg.norm(reshaped_data)
+                if norm > 0:
+                    reshaped_data /= norm
+                ret.append(
+                    dict(
+                        id=tensor_info["index"],
+                        name=tensor_info["name"],
+                        shape=reshaped_data.shape,
+                        quantization=dict(axis=-1, scale=[1], zero=[0]),
+                        type="DG_FLT",
+                        size=reshaped_data.size,
+                        data=reshaped_data,
+                        normalized=True,
+                    )
+                )
+                continue
+
             dequantized_data = (
                 data.astype(np.float32) - quantization[1]
             ) * quantization[0]
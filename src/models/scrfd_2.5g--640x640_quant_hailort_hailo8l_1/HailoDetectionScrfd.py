@@ -32,6 +32,9 @@ class PostProcessor:
         self.num_classes = 1  # Fixed for SCRFD
         self.num_landmarks = 10  # Fixed for SCRFD
         self.num_branches = len(self.strides)
+        # Opt-in: return one dict of NumPy arrays per image instead of a dict
+        # per detection (see _compact_result)
+        self.compact_output = bool(post_process.get("OutputCompact", False))
 
         # Load label dictionary
         label_path = post_process.get("LabelsPath", None)
@@ -40,12 +43,14 @@ class PostProcessor:
         with open(label_path, "r") as json_file:
             self._label_dictionary = json.load(json_file)
 
-        # Generate anchors dynamically
-        self.anchors = self._generate_anchors(self.min_sizes, self.steps)
+        # Generate anchors once, in pixel units, with per-branch start offsets
+        self.anchors, self.branch_offsets = self._generate_anchors(
+            self.min_sizes, self.steps
+        )
 
     def _generate_anchors(self, min_sizes, steps):
-        """Generate anchor boxes for detection."""
-        anchors = []
+        """Generate anchor boxes (cx, cy, sx, sy in pixels) for detection."""
+        anchors, offsets, total = [], [], 0
         for stride, min_size in zip(steps, min_sizes):
             height, width = self.image_height // stride, self.image_width // stride
             num_anchors = len(min_size)
@@ -54,16 +59,96 @@ class PostProcessor:
                 np.float32
             )
             centers = (centers * stride).reshape((-1, 2))
-            centers[:, 0] /= self.image_width
-            centers[:, 1] /= self.image_height
 
             if num_anchors > 1:
                 centers = np.stack([centers] * num_anchors, axis=1).reshape((-1, 2))
-            scales = np.ones_like(centers, dtype=np.float32) * stride
-            scales[:, 0] /= self.image_width
-            scales[:, 1] /= self.image_height
+            scales = np.full_like(centers, stride, dtype=np.float32)
             anchors.append(np.concatenate([centers, scales], axis=1))
-        return np.concatenate(anchors, axis=0)
+            offsets.append(total)
+            total += len(centers)
+        return np.concatenate(anchors, axis=0), offsets
+
+    @staticmethod
+    def _quant_params(tensor_info):
+        """Return per-tensor (scale, zero_point) as floats."""
+        quantization = tensor_info["quantization"]
+        scale = float(np.ravel(quantization[0])[0])
+        zero_point = float(np.ravel(quantization[1])[0])
+        return scale, zero_point
+
+    def _score_mask(self, scores, scale, zero_point):
+        """
+        Threshold raw scores without dequantizing the whole tensor.
+
+        For integer tensors the float threshold is mapped into the quantized
+        domain once, so the comparison runs on the raw values.
+        """
+        if not np.issubdtype(scores.dtype, np.integer) or scale <= 0:
+            return (scores.astype(np.float32) - zero_point) * scale >= self.score_threshold
+        q_thr = int(np.ceil(self.score_threshold / scale + zero_point - 1e-6))
+        info = np.iinfo(scores.dtype)
+        if q_thr > info.max:
+            return np.zeros(scores.shape, dtype=bool)
+        return scores >= max(q_thr, info.min)
+
+    def _gather_candidates(self, tensor_list, details_list):
+        """
+        Threshold every score tensor first, then dequantize and decode boxes
+        and landmarks only for the surviving anchors.
+
+        Returns:
+            tuple: (batch_idx, boxes, scores, landmarks) for all candidates;
+            landmarks is None when the model has no landmark outputs.
+        """
+        num_outputs = len(tensor_list)
+        include_landmarks = (num_outputs // self.num_branches) > 2
+
+        batch_idx, boxes, scores, landmarks = [], [], [], []
+        for branch, i in enumerate(range(0, num_outputs, self.num_branches)):
+            batch_size = tensor_list[i].shape[0]
+
+            cls_scale, cls_zero = self._quant_params(details_list[i + 1])
+            cls_raw = tensor_list[i + 1].reshape(batch_size, -1)
+            b_idx, a_idx = np.nonzero(self._score_mask(cls_raw, cls_scale, cls_zero))
+            if a_idx.size == 0:
+                continue
+
+            anchors = self.anchors[self.branch_offsets[branch] + a_idx]
+            scores.append((cls_raw[b_idx, a_idx].astype(np.float32) - cls_zero) * cls_scale)
+            batch_idx.append(b_idx)
+
+            box_scale, box_zero = self._quant_params(details_list[i])
+            box_raw = tensor_list[i].reshape(batch_size, -1, 4)[b_idx, a_idx]
+            boxes.append(
+                self._decode_boxes((box_raw.astype(np.float32) - box_zero) * box_scale, anchors)
+            )
+
+            if include_landmarks:
+                lm_scale, lm_zero = self._quant_params(details_list[i + 2])
+                lm_raw = tensor_list[i + 2].reshape(batch_size, -1, self.num_landmarks)[
+                    b_idx, a_idx
+                ]
+                landmarks.append(
+                    self._decode_landmarks(
+                        (lm_raw.astype(np.float32) - lm_zero) * lm_scale, anchors
+                    )
+                )
+
+        if not scores:
+            return (
+                np.empty((0,), dtype=np.intp),
+                np.empty((0, 4), dtype=np.float32),
+                np.empty((0,), dtype=np.float32),
+                np.empty((0, self.num_landmarks), dtype=np.float32)
+                if include_landmarks
+                else None,
+            )
+        return (
+            np.concatenate(batch_idx),
+            np.concatenate(boxes),
+            np.concatenate(scores),
+            np.concatenate(landmarks) if include_landmarks else None,
+        )
 
     def forward(self, tensor_list, details_list):
         """
@@ -76,56 +161,22 @@ class PostProcessor:
         Returns:
             str: JSON string containing processed inference results.
         """
-        # Step 1: Dequantize tensors
-        dequantized_tensors = []
-        for data, tensor_info in zip(tensor_list, details_list):
-            quantization = tensor_info["quantization"]
-            scale, zero_point = quantization[0], quantization[1]
-            dequantized_data = (data.astype(np.float32) - zero_point) * scale
-            dequantized_tensors.append(dequantized_data)
-
-        # Step 2: Collect predictions for boxes, classes, and landmarks
-        box_preds, class_preds, landmark_preds = self._collect_predictions(
-            dequantized_tensors
+        # Step 1: Threshold scores and decode only the surviving anchors
+        cand_batch, cand_boxes, cand_scores, cand_landmarks = self._gather_candidates(
+            tensor_list, details_list
         )
+        batch_size = tensor_list[0].shape[0] if tensor_list else 0
 
-        # Step 3: Decode bounding boxes and reshape to batch dimensions
-        batch_size = box_preds.shape[
-            0
-        ]  # Get the batch size from the first dimension of predictions
-        decoded_boxes = self._decode_boxes(box_preds.reshape(-1, 4), self.anchors)
-        detection_boxes = decoded_boxes.reshape(
-            batch_size, -1, 4
-        )  # Restore batch dimension
-
-        # Step 4: Decode landmarks (if available) and reshape to batch dimensions
-        if landmark_preds is not None:
-            decoded_landmarks = self._decode_landmarks(
-                landmark_preds.reshape(-1, self.num_landmarks), self.anchors
-            )
-            detection_landmarks = decoded_landmarks.reshape(
-                batch_size, -1, self.num_landmarks
-            )
-        else:
-            detection_landmarks = None
-
-        # Step 5: Process each batch independently
+        # Step 2: Process each batch independently
         new_inference_results = []
         for batch_idx in range(batch_size):
-            boxes = detection_boxes[batch_idx]
-            scores = class_preds[batch_idx].squeeze(-1)
-            landmarks = (
-                detection_landmarks[batch_idx]
-                if detection_landmarks is not None
-                else None
+            in_batch = cand_batch == batch_idx
+            filtered_boxes = cand_boxes[in_batch]
+            filtered_scores = cand_scores[in_batch]
+            filtered_landmarks = (
+                cand_landmarks[in_batch] if cand_landmarks is not None else None
             )
 
-            # Filter by score threshold
-            mask = scores >= self.score_threshold
-            filtered_boxes = boxes[mask]
-            filtered_scores = scores[mask]
-            filtered_landmarks = landmarks[mask] if landmarks is not None else None
-
             # Apply Non-Maximum Suppression
             keep_indices = self._apply_non_max_suppression(
                 filtered_boxes, filtered_scores
@@ -138,6 +189,12 @@ class PostProcessor:
                 else None
             )
 
+            if self.compact_output:
+                new_inference_results.append(
+                    self._compact_result(final_boxes, final_scores, final_landmarks)
+                )
+                continue
+
             # Prepare results for this batch
             for i in range(len(final_boxes)):
                 category_id = 0  # Assuming single class for SCRFD
@@ -174,60 +231,37 @@ class PostProcessor:
 
         return new_inference_results
 
-    def _collect_predictions(self, outputs):
-        """Collect predictions for boxes, classes, and optionally landmarks."""
-        box_preds, class_preds, landmark_preds = [], [], []
-        num_outputs = len(outputs)
-
-        # Infer presence of landmarks based on the number of outputs
-        include_landmarks = (num_outputs // self.num_branches) > 2
-
-        for i in range(0, num_outputs, self.num_branches):
-            batch_size = outputs[i].shape[0]
-            box_preds.append(outputs[i].reshape(batch_size, -1, 4))
-            class_preds.append(outputs[i + 1].reshape(batch_size, -1, self.num_classes))
-
-            if include_landmarks:
-                landmark_preds.append(
-                    outputs[i + 2].reshape(batch_size, -1, self.num_landmarks)
-                )
-
-        box_preds = np.concatenate(box_preds, axis=1)
-        class_preds = np.concatenate(class_preds, axis=1)
-        landmark_preds = (
-            np.concatenate(landmark_preds, axis=1) if include_landmarks else None
-        )
-
-        return box_preds, class_preds, landmark_preds
+    def _compact_result(self, boxes, scores, landmarks):
+        """
+        Pack one image's detections as arrays: boxes (N, 4), scores (N,) and
+        landmarks (N, 5, 2), all float32 in model input pixel coordinates.
+        """
+        category_id = 0  # Assuming single class for SCRFD
+        num_points = self.num_landmarks // 2 if landmarks is not None else 0
+        if landmarks is None:
+            landmarks = np.empty((len(boxes), 0), dtype=np.float32)
+        return {
+            "boxes": np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+            "scores": np.asarray(scores, dtype=np.float32).reshape(-1),
+            "landmarks": np.asarray(landmarks, dtype=np.float32).reshape(
+                len(boxes), num_points, 2
+            ),
+            "category_id": category_id,
+            "label": self._label_dictionary.get(str(category_id), f"class_{category_id}"),
+        }
 
     def _decode_boxes(self, box_detections, anchors):
-        """Decode bounding boxes using anchor offsets and scale to image size."""
-        x1 = anchors[:, 0] - box_detections[:, 0] * anchors[:, 2]
-        y1 = anchors[:, 1] - box_detections[:, 1] * anchors[:, 3]
-        x2 = anchors[:, 0] + box_detections[:, 2] * anchors[:, 2]
-        y2 = anchors[:, 1] + box_detections[:, 3] * anchors[:, 3]
-
-        # Scale to image size
-        x1 *= self.image_width
-        y1 *= self.image_height
-        x2 *= self.image_width
-        y2 *= self.image_height
-
-        return np.stack([x1, y1, x2, y2], axis=-1)
+        """Decode bounding boxes using pixel-unit anchor offsets."""
+        centers, scales = anchors[:, :2], anchors[:, 2:]
+        top_left = centers - box_detections[:, :2] * scales
+        bottom_right = centers + box_detections[:, 2:] * scales
+        return np.concatenate([top_left, bottom_right], axis=-1)
 
     def _decode_landmarks(self, landmark_detections, anchors):
-        """Decode facial landmarks using anchor offsets and scale to image size."""
-        predictions = []
-        for i in range(0, self.num_landmarks, 2):
-            px = anchors[:, 0] + landmark_detections[:, i] * anchors[:, 2]
-            py = anchors[:, 1] + landmark_detections[:, i + 1] * anchors[:, 3]
-
-            # Scale to image size
-            px *= self.image_width
-            py *= self.image_height
-
-            predictions.extend([px, py])
-        return np.stack(predictions, axis=-1)
+        """Decode facial landmarks using pixel-unit anchor offsets."""
+        points = landmark_detections.reshape(len(landmark_detections), -1, 2)
+        points = anchors[:, None, :2] + points * anchors[:, None, 2:]
+        return points.reshape(len(landmark_detections), -1)
 
     def _apply_non_max_suppression(self, boxes, scores):
         """Apply Non-Maximum Suppression (NMS) to remove redundant detections."""
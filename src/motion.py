@@ -0,0 +1,68 @@
+# motion.py
+"""
+MotionGate decides cheaply whether a camera frame is worth running the face
+detector on. Frames are downscaled to a tiny grayscale image and compared
+against a running-average background; static scenes are skipped except for a
+low-rate keepalive detection.
+"""
+import cv2
+import numpy as np
+
+from config import (
+    MOTION_GATE_ENABLED,
+    MOTION_SIZE,
+    MOTION_PIXEL_DELTA,
+    MOTION_MIN_AREA,
+    MOTION_BG_ALPHA,
+    MOTION_KEEPALIVE_S,
+)
+
+
+class MotionGate:
+    def __init__(self):
+        # Preallocated working buffers (MOTION_SIZE is (width, height))
+        w, h = MOTION_SIZE
+        self._small = None
+        self._gray = np.empty((h, w), dtype=np.uint8)
+        self._diff = np.empty((h, w), dtype=np.uint8)
+        self._background = None   # float32 running average
+
+        self._last_pass = None
+        self.passed = 0
+        self.skipped = 0
+        self.last_score = 0.0
+
+    def check(self, frame: np.ndarray, now: float, force: bool = False) -> bool:
+        """
+        Update the background model and decide whether to run detection.
+
+        :param frame: full camera frame (H x W x 3)
+        :param now: time.monotonic()
+        :param force: let the frame through regardless (e.g. faces are tracked)
+        :return: True if the detector should run on this frame
+        """
+        if not MOTION_GATE_ENABLED:
+            self.passed += 1
+            return True
+
+        self._small = cv2.resize(frame, MOTION_SIZE, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        if self._background is None:
+            self._background = self._gray.astype(np.float32)
+            self.last_score = 1.0
+        else:
+            cv2.absdiff(self._gray, self._background.astype(np.uint8), dst=self._diff)
+            self.last_score = float(np.count_nonzero(self._diff > MOTION_PIXEL_DELTA)) / self._diff.size
+            cv2.accumulateWeighted(self._gray, self._background, MOTION_BG_ALPHA)
+
+        keepalive = self._last_pass is None or now - self._last_pass >= MOTION_KEEPALIVE_S
+        if force or keepalive or self.last_score >= MOTION_MIN_AREA:
+            self._last_pass = now
+            self.passed += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def stats(self) -> dict:
+        return {"passed": self.passed, "skipped": self.skipped, "last_score": round(self.last_score, 4)}
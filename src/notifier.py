@@ -2,58 +2,417 @@
 """
 Notifier module handles all outbound HTTP notifications:
 - Door status updates
-- Unknown-face image uploads
+- Unknown-face uploads: padded face crop plus an optional context
+  thumbnail, size-capped by encode_capped()
+
+notify_status() and notify_unknown_face() only enqueue and return at once;
+a background NotifierOutbox delivers in order:
+- status updates are coalesced: only the latest door state is sent
+- failed deliveries are retried with exponential backoff
+- while the server is unreachable, pending messages are written to an
+  append-only JSONL spool (NOTIFY_SPOOL_PATH) and replayed after a restart
 """
 import base64
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
 import cv2
+import numpy as np
 import requests
 import datetime
+from http_client import get_http_client
+from metrics import METRICS
 from typing import Optional
-from config import ANON_STORE_URL, DOOR_STATUS_URL
+from config import (
+    ANON_STORE_URL,
+    DOOR_STATUS_URL,
+    NOTIFY_SPOOL_PATH,
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_RETRY_BASE_S,
+    NOTIFY_RETRY_MAX_S,
+    NOTIFY_SPOOL_MAX_BYTES,
+    UNKNOWN_CROP_PAD,
+    UNKNOWN_CROP_MAX_PX,
+    UNKNOWN_THUMBNAIL_PX,
+    UNKNOWN_JPEG_QUALITY,
+    UNKNOWN_JPEG_MIN_QUALITY,
+    UNKNOWN_UPLOAD_MAX_BYTES,
+    UNKNOWN_ENCODE_BUDGET_S,
+)
+
+
+class NotifierOutbox(threading.Thread):
+    def __init__(self, spool_path: str | None = NOTIFY_SPOOL_PATH, maxsize: int = NOTIFY_QUEUE_SIZE):
+        """
+        :param spool_path: append-only spool file; None disables spooling
+        :param maxsize: queued non-status messages kept in memory; the oldest
+                        is dropped when full
+        """
+        super().__init__(name="notifier", daemon=True)
+        self.spool_path = spool_path
+        self._cond = threading.Condition()
+        self._status = None                       # latest door status message
+        self._queue = deque(maxlen=max(1, maxsize))
+        self._in_flight = None
+        self._superseded = []                     # replaced statuses to ack on disk
+        self._failures = 0
+        self._spool_dirty = False                 # spool holds records since the last compaction
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.retries = 0
+        self._replay_spool()
+
+    # ─── Producer side (any thread, never blocks on I/O) ─────────────────
+    def post(self, kind: str, url: str, payload: dict | None = None, build=None) -> None:
+        """
+        Queue a message for delivery.
+
+        :param kind: "door_status" messages replace any undelivered status
+        :param url: endpoint to POST the JSON payload to
+        :param payload: JSON body, or None if `build` produces it
+        :param build: optional callable returning the payload, run on the
+                      sender thread (e.g. to encode images off the caller)
+        """
+        msg = {"id": uuid.uuid4().hex, "kind": kind, "url": url, "payload": payload,
+               "created": time.time(), "build": build, "spooled": False}
+        with self._cond:
+            if kind == "door_status":
+                if self._status is not None:
+                    self.coalesced += 1
+                    self._superseded.append(self._status)
+                self._status = msg
+            else:
+                if len(self._queue) == self._queue.maxlen:
+                    self.dropped += 1
+                self._queue.append(msg)
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue) + (self._status is not None) + (self._in_flight is not None)
+
+    def flush(self, timeout: float) -> bool:
+        """
+        Wait until everything queued so far has been delivered.
+
+        :return: False on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> dict:
+        return {"pending": self.pending(), "sent": self.sent, "coalesced": self.coalesced,
+                "dropped": self.dropped, "retries": self.retries}
+
+    # ─── Sender thread ───────────────────────────────────────────────────
+    def _next(self) -> dict:
+        with self._cond:
+            self._cond.wait_for(lambda: self._status is not None or self._queue)
+            # the door state goes first: it is what the server shows right now
+            if self._status is not None:
+                msg, self._status = self._status, None
+            else:
+                msg = self._queue.popleft()
+            self._in_flight = msg
+            return msg
+
+    def _requeue(self, msg: dict) -> None:
+        with self._cond:
+            self._in_flight = None
+            if msg["kind"] != "door_status":
+                self._queue.appendleft(msg)
+            elif self._status is None:
+                self._status = msg
+            else:
+                self._superseded.append(msg)   # a newer state arrived meanwhile
+
+    def _deliver(self, msg: dict) -> bool:
+        """
+        POST one message.
+
+        :return: True if delivered or permanently rejected, False to retry
+        """
+        if not self._build(msg):
+            return True
+        try:
+            resp = get_http_client().post(msg["url"], msg["kind"], json=msg["payload"])
+        except requests.RequestException as exc:
+            print(f"[NOTIFIER] Failed to send {msg['kind']}: {exc}")
+            return False
+        if resp.status_code >= 500 or resp.status_code in (408, 429):
+            print(f"[NOTIFIER] Server busy for {msg['kind']} ({resp.status_code}), will retry")
+            return False
+        if resp.status_code >= 400:
+            print(f"[NOTIFIER] Server rejected {msg['kind']} ({resp.status_code}), dropping")
+        else:
+            print(f"[NOTIFIER] {msg['kind']} sent ({resp.status_code})")
+            self.sent += 1
+        return True
+
+    def run(self):
+        while True:
+            msg = self._next()
+            if self._deliver(msg):
+                self._failures = 0
+                with self._cond:
+                    self._in_flight = None
+                    done, self._superseded = [msg] + self._superseded, []
+                    drained = not self._queue and self._status is None
+                for m in done:
+                    self._ack(m)
+                if drained and self._spool_dirty:
+                    self._compact_spool()
+                continue
+
+            # server unreachable: keep everything pending on disk and back off
+            self._failures += 1
+            self.retries += 1
+            METRICS.inc("notify_retries", kind=msg["kind"])
+            with self._cond:
+                waiting = ([self._status] if self._status else []) + list(self._queue)
+            for m in [msg] + waiting:
+                self._spool(m)
+            self._requeue(msg)
+            delay = min(NOTIFY_RETRY_MAX_S, NOTIFY_RETRY_BASE_S * 2 ** (self._failures - 1))
+            time.sleep(delay)
+
+    # ─── Spool (append-only JSONL: message records and ack records) ──────
+    def _append(self, record: dict) -> None:
+        if not self.spool_path:
+            return
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self._spool_dirty = True
+        except OSError as e:
+            print(f"[NOTIFIER] Failed to write spool: {e}")
+
+    def _spool(self, msg: dict) -> None:
+        if msg["spooled"] or not self._build(msg):
+            return
+        self._append({k: msg[k] for k in ("id", "kind", "url", "payload", "created")})
+        msg["spooled"] = True
+        try:
+            too_big = os.path.getsize(self.spool_path) > NOTIFY_SPOOL_MAX_BYTES
+        except (OSError, TypeError):
+            too_big = False
+        if too_big:
+            self._compact_spool()
+
+    @staticmethod
+    def _build(msg: dict) -> bool:
+        """Produce a deferred payload once; False if there is nothing to send."""
+        if msg["payload"] is None and msg["build"] is not None:
+            try:
+                msg["payload"] = msg["build"]()
+            except Exception as e:
+                print(f"[NOTIFIER] Failed to build {msg['kind']} payload: {e}")
+            msg["build"] = None
+        return msg["payload"] is not None
+
+    def _ack(self, msg: dict) -> None:
+        if msg["spooled"]:
+            self._append({"ack": msg["id"]})
+
+    def _compact_spool(self) -> None:
+        """
+        Rewrite the spool with only the undelivered messages, dropping the
+        oldest unknown-face uploads if it would still exceed the size cap.
+        """
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        with self._cond:
+            pending = [m for m in ([self._in_flight, self._status] + list(self._queue))
+                       if m is not None and m["spooled"]]
+        lines = [json.dumps({k: m[k] for k in ("id", "kind", "url", "payload", "created")})
+                 for m in pending]
+        while lines and sum(len(line) + 1 for line in lines) > NOTIFY_SPOOL_MAX_BYTES:
+            drop = next((i for i, m in enumerate(pending) if m["kind"] != "door_status"), None)
+            if drop is None:
+                break
+            pending[drop]["spooled"] = False
+            del pending[drop], lines[drop]
+            self.dropped += 1
+        tmp = f"{self.spool_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(line + "\n" for line in lines)
+            os.replace(tmp, self.spool_path)
+            self._spool_dirty = bool(lines)
+        except OSError as e:
+            print(f"[NOTIFIER] Failed to compact spool: {e}")
+
+    def _replay_spool(self) -> None:
+        """Load messages left undelivered by a previous run."""
+        if not self.spool_path:
+            return
+        records, acked = {}, set()
+        try:
+            os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+            with open(self.spool_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue     # torn last line after a crash
+                    self._spool_dirty = True
+                    if "ack" in rec:
+                        acked.add(rec["ack"])
+                    elif "id" in rec:
+                        records[rec["id"]] = rec
+        except OSError:
+            return
+        for rec in records.values():
+            if rec["id"] in acked:
+                continue
+            msg = dict(rec, build=None, spooled=True)
+            if rec["kind"] == "door_status":
+                if self._status is not None:
+                    self.coalesced += 1
+                    self._superseded.append(self._status)
+                self._status = msg
+            else:
+                self._queue.append(msg)
+        if self._status is not None or self._queue:
+            print(f"[NOTIFIER] Replaying {len(self._queue) + (self._status is not None)} spooled messages")
+
+
+METRICS.describe("notify_retries", "Failed notifier deliveries that were retried, by message kind")
+
+_OUTBOX: NotifierOutbox | None = None
+_OUTBOX_LOCK = threading.Lock()
+
+
+def get_outbox() -> NotifierOutbox:
+    """Return the shared outbox, starting its sender thread on first use."""
+    global _OUTBOX
+    with _OUTBOX_LOCK:
+        if _OUTBOX is None:
+            _OUTBOX = NotifierOutbox()
+            _OUTBOX.start()
+        return _OUTBOX
 
 
 def notify_status(status: str) -> None:
     """
-    Send a door status update to the server.
+    Queue a door status update for the server (non-blocking).
 
     :param status: "OPEN" or "CLOSED"
     """
-    payload = {"status": status}
-    try:
-        resp = requests.post(DOOR_STATUS_URL, json=payload, timeout=5)
-        resp.raise_for_status()
-        print(f"[NOTIFIER] Door status '{status}' sent ({resp.status_code})")
-    except requests.RequestException as exc:
-        print(f"[NOTIFIER] Failed to send door status '{status}': {exc}")
+    get_outbox().post("door_status", DOOR_STATUS_URL, {"status": status})
 
 
-def notify_unknown_face(frame: Optional[cv2.UMat], embedding: Optional[list]) -> None:
+def _padded_crop(frame: np.ndarray, box, pad: float = UNKNOWN_CROP_PAD,
+                 max_px: int = UNKNOWN_CROP_MAX_PX) -> np.ndarray | None:
+    """
+    Crop the box plus a `pad` margin from frame, downscaled to at most max_px.
     """
-    Upload an unknown person's face image and embedding to the server.
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = np.asarray(box, dtype=np.float32)
+    mx, my = (x2 - x1) * pad, (y2 - y1) * pad
+    x1, y1 = max(int(x1 - mx), 0), max(int(y1 - my), 0)
+    x2, y2 = min(int(x2 + mx), w), min(int(y2 + my), h)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return _fit(frame[y1:y2, x1:x2], max_px)
 
-    :param frame: BGR or RGB image array; if None, function returns immediately
-    :param embedding: list of floats representing the face vector
+
+def _fit(img: np.ndarray, max_px: int) -> np.ndarray:
+    scale = max_px / max(img.shape[:2])
+    if scale >= 1.0:
+        return img
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def _jpeg(img: np.ndarray, quality: int) -> bytes | None:
+    success, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes() if success else None
+
+
+def encode_capped(face: np.ndarray, thumb: np.ndarray | None,
+                  max_bytes: int = UNKNOWN_UPLOAD_MAX_BYTES,
+                  budget_s: float = UNKNOWN_ENCODE_BUDGET_S) -> tuple[bytes | None, bytes | None]:
     """
-    if frame is None or embedding is None:
-        return
+    JPEG-encode the face crop and optional thumbnail within max_bytes in total.
 
-    # Encode image to JPEG
-    success, buf = cv2.imencode('.jpg', frame)
-    if not success:
-        print("[NOTIFIER] Failed to encode frame to JPEG")
-        return
+    Quality is lowered step by step down to UNKNOWN_JPEG_MIN_QUALITY (or until
+    budget_s is spent); after that the thumbnail is dropped and finally the
+    crop is downscaled.
+
+    :return: (face_jpg, thumb_jpg); face_jpg is None if nothing fits
+    """
+    start = time.monotonic()
+    quality = UNKNOWN_JPEG_QUALITY
+    while True:
+        face_jpg = _jpeg(face, quality)
+        if face_jpg is None:
+            return None, None
+        thumb_jpg = _jpeg(thumb, quality) if thumb is not None else None
+        if len(face_jpg) + len(thumb_jpg or b"") <= max_bytes:
+            return face_jpg, thumb_jpg
+        if quality - 15 < UNKNOWN_JPEG_MIN_QUALITY or time.monotonic() - start > budget_s:
+            break
+        quality -= 15
+    while len(face_jpg) > max_bytes and min(face.shape[:2]) > 32:
+        face = cv2.resize(face, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        face_jpg = _jpeg(face, UNKNOWN_JPEG_MIN_QUALITY) or face_jpg
+    return (face_jpg, None) if len(face_jpg) <= max_bytes else (None, None)
+
+
+def _data_uri(jpg: bytes) -> str:
+    return "data:image/jpeg;base64," + base64.b64encode(jpg).decode('utf-8')
+
+
+def _unknown_face_payload(frame, embedding: list, timestamp: str, box, face) -> dict | None:
+    # padded crop of the detection; the aligned crop is the fallback
+    crop = _padded_crop(frame, box) if frame is not None and box is not None else None
+    if crop is None:
+        crop = face
+    if crop is None:
+        print("[NOTIFIER] No face image for unknown-face upload")
+        return None
+    thumb = _fit(frame, UNKNOWN_THUMBNAIL_PX) if frame is not None and UNKNOWN_THUMBNAIL_PX > 0 else None
+
+    face_jpg, thumb_jpg = encode_capped(crop, thumb)
+    if face_jpg is None:
+        print("[NOTIFIER] Failed to encode face crop within the upload size cap")
+        return None
 
-    # Base64 payload
-    b64jpg = base64.b64encode(buf).decode('utf-8')
     payload = {
         'name': 'Unknown Person',
         'vector_data': embedding,
-        'face_image_base64': f"data:image/jpeg;base64,{b64jpg}",
-        'timestamp': datetime.datetime.utcnow().isoformat() + 'Z'
+        'face_image_base64': _data_uri(face_jpg),
+        'timestamp': timestamp
     }
-    try:
-        resp = requests.post(ANON_STORE_URL, json=payload, timeout=5)
-        resp.raise_for_status()
-        print(f"[NOTIFIER] Unknown face uploaded ({resp.status_code})")
-    except requests.RequestException as exc:
-        print(f"[NOTIFIER] Failed to upload unknown face: {exc}")
+    if box is not None:
+        payload['bbox'] = [round(float(v), 1) for v in box]
+    if thumb_jpg is not None:
+        payload['context_image_base64'] = _data_uri(thumb_jpg)
+    return payload
+
+
+def notify_unknown_face(frame: Optional[np.ndarray], embedding: Optional[list],
+                        box: Optional[np.ndarray] = None, face: Optional[np.ndarray] = None) -> None:
+    """
+    Queue an unknown person's face crop and embedding for upload
+    (non-blocking; cropping and JPEG encoding run on the sender thread).
+
+    :param frame: BGR or RGB camera frame (or None if only `face` is available)
+    :param embedding: list of floats representing the face vector
+    :param box: x1, y1, x2, y2 of the face in frame; without it the aligned
+                crop is uploaded instead of a padded crop
+    :param face: aligned face crop
+    """
+    if embedding is None or (frame is None and face is None):
+        return
+    timestamp = datetime.datetime.utcnow().isoformat() + 'Z'
+    get_outbox().post("unknown_face", ANON_STORE_URL,
+                      build=lambda: _unknown_face_payload(frame, embedding, timestamp, box, face))
@@ -0,0 +1,79 @@
+# pipeline.py
+"""
+Building blocks for the staged recognition pipeline:
+- DropOldestQueue: bounded queue that evicts the oldest item instead of blocking
+- Stage: worker thread that pulls from one queue, applies a function and
+  pushes the result to the next queue
+"""
+import threading
+from collections import deque
+from typing import Any, Callable, Optional
+
+
+class DropOldestQueue:
+    def __init__(self, maxsize: int, name: str = ""):
+        """
+        :param maxsize: maximum number of queued items (>= 1)
+        :param name: label used in stats output
+        """
+        self.name = name
+        self._items = deque(maxlen=max(1, maxsize))
+        self._cond = threading.Condition()
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        """
+        Enqueue without blocking; if full, the oldest item is discarded.
+        """
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """
+        Dequeue the oldest item, waiting up to `timeout` seconds.
+
+        :return: the item, or None on timeout
+        """
+        with self._cond:
+            if not self._items and not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+    def depth(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        return {"depth": len(self._items), "put": self.put_count, "dropped": self.dropped}
+
+
+class Stage(threading.Thread):
+    def __init__(self, name: str, fn: Callable[[Any], Any],
+                 inbox: DropOldestQueue, outbox: Optional[DropOldestQueue] = None):
+        """
+        :param name: thread name
+        :param fn: called with each item; a None return value is not forwarded
+        :param inbox: queue to read from
+        :param outbox: queue to forward results to (optional)
+        """
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.processed = 0
+
+    def run(self):
+        while True:
+            item = self.inbox.get()
+            try:
+                out = self.fn(item)
+            except Exception as e:
+                print(f"[pipeline] {self.name} stage error: {e}")
+                continue
+            self.processed += 1
+            if out is not None and self.outbox is not None:
+                self.outbox.put(out)
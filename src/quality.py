@@ -0,0 +1,59 @@
+# quality.py
+"""
+Face quality scoring used to skip crops that will never produce a useful
+embedding:
+- detection_quality(): vectorized score from box size, detector confidence
+  and the 5-point landmark geometry (yaw / roll estimate)
+- sharpness_quality(): Laplacian-variance sharpness of an aligned crop
+
+All scores are in [0, 1] and multiply into one quality value, which is also
+used as the weight of the embedding in the per-track aggregate.
+"""
+import cv2
+import numpy as np
+
+from config import (
+    QUALITY_MIN_FACE_PX,
+    QUALITY_GOOD_FACE_PX,
+    QUALITY_MAX_YAW,
+    QUALITY_MAX_ROLL_DEG,
+    QUALITY_SHARPNESS_GOOD,
+)
+
+
+def detection_quality(boxes: np.ndarray, scores: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
+    """
+    Geometry-based quality for N detections, available before alignment.
+
+    :param boxes: (N, 4) x1, y1, x2, y2
+    :param scores: (N,) detector confidence
+    :param landmarks: (N, 5, 2) eyes, nose, mouth corners
+    :return: (N,) quality in [0, 1]
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    lms = np.asarray(landmarks, dtype=np.float32).reshape(-1, 5, 2)
+
+    # size: smaller side of the box, ramped between the min and good sizes
+    side = np.minimum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+    size_q = np.clip((side - QUALITY_MIN_FACE_PX) / (QUALITY_GOOD_FACE_PX - QUALITY_MIN_FACE_PX), 0, 1)
+
+    # pose: roll from the eye line, yaw from the nose offset along that line
+    eye_vec = lms[:, 1] - lms[:, 0]
+    eye_dist = np.maximum(np.linalg.norm(eye_vec, axis=1), 1e-3)
+    roll = np.degrees(np.abs(np.arctan2(eye_vec[:, 1], eye_vec[:, 0])))
+    nose_off = lms[:, 2] - (lms[:, 0] + lms[:, 1]) / 2
+    yaw = np.abs(np.einsum("ij,ij->i", nose_off, eye_vec)) / (eye_dist ** 2)
+    pose_q = np.clip(1 - yaw / QUALITY_MAX_YAW, 0, 1) * np.clip(1 - roll / QUALITY_MAX_ROLL_DEG, 0, 1)
+
+    return size_q * np.clip(np.asarray(scores, dtype=np.float32), 0, 1) * pose_q
+
+
+def sharpness_quality(crop: np.ndarray) -> float:
+    """
+    Sharpness of an aligned face crop from the variance of its Laplacian.
+
+    :return: quality in [0, 1]; QUALITY_SHARPNESS_GOOD or sharper maps to 1
+    """
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    var = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+    return min(var / QUALITY_SHARPNESS_GOOD, 1.0)
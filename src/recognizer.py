@@ -2,113 +2,282 @@
 """
 RecognizerThread continuously reads frames from the camera, performs face detection
 and recognition, then pushes events to a shared queue:
-- ('recognized', name, frame)
-- ('unknown', embedding, frame)
+- ('recognized', name, frame, trace)
+- ('unknown', embedding, frame, box, face, trace): box is the detection in
+  frame, face the track's best aligned 112x112 crop
+
+Detection, tracking and the motion gate run on the camera's detection-size
+frame; when the camera also holds a full-resolution image, only the regions
+of faces due for embedding are copied out of it and the ArcFace crops are
+aligned from those. Unknown-face uploads use the detection frame.
+
+Every frame carries a metrics.Trace from capture through the stages; events
+carry a copy so the main loop can extend it up to the door command.
+
+Work is split into three stages connected by bounded drop-oldest queues so the
+detector can start on the next frame while the current one is being embedded:
+  detect + track (RecognizerThread.run) -> align/embed -> match/decision
+
+Detections are tracked across frames; ArcFace only runs for tracks that are
+new, due for a refresh, or whose box changed significantly, and each track
+keeps its own identity and unknown dwell timer. Identity is decided on the
+track's aggregated embedding, so borderline frames accumulate evidence instead
+of being discarded. Small, blurred or strongly turned faces are skipped before
+they reach ArcFace (see quality.py). A motion gate skips detection on static,
+empty scenes.
 """
 import threading
 import time
+from dataclasses import dataclass, field
 import numpy as np
-import degirum as dg
 
-from config import FACE_DET_MODEL, FACE_REC_MODEL, INFERENCE_HOST, ZOO_URL, THRESHOLD
-from utils import align_and_crop, fetch_authorized_faces, AUTHORIZED
+from config import (
+    THRESHOLD, UNKNOWN_DELAY, RECOGNIZED_DELAY, FACE_QUALITY_MIN,
+    PIPELINE_QUEUE_SIZE, PIPELINE_MAX_LATENCY_S, PIPELINE_STATS_INTERVAL_S,
+    CAMERA_WAIT_TIMEOUT_S,
+)
+from metrics import METRICS, Trace
+from motion import MotionGate
+from pipeline import DropOldestQueue, Stage
+from inference import get_inference_service
+from quality import detection_quality, sharpness_quality
+from tracker import FaceTracker
+from utils import align_and_crop, load_authorized_faces, GALLERY
 
 # below this sim or lower, we treat as "unknown"
 UNKNOWN_SIM_THRESHOLD = 0.4  # was 0.1, now more reasonable
 
+
+@dataclass
+class FrameJob:
+    """One frame travelling through the pipeline."""
+    frame: np.ndarray                                # detection-size frame
+    captured: float                                  # time.monotonic() at pickup
+    trace: Trace                                     # stage timestamps from camera capture
+    boxes: np.ndarray | None = None                  # (N, 4) detections inside the frame
+    scores: np.ndarray | None = None                 # (N,)
+    landmarks: np.ndarray | None = None              # (N, 5, 2)
+    quality: np.ndarray | None = None                # (N,) geometry-based quality
+    tracks: list = field(default_factory=list)       # N tracks, one per detection
+    embed_idx: list = field(default_factory=list)    # detections that need ArcFace
+    faces: list = field(default_factory=list)        # aligned crops for embed_idx
+    weights: list = field(default_factory=list)      # final quality per crop
+    embs: np.ndarray | None = None                   # (len(embed_idx), D) normalized embeddings
+    rois: list | None = None                         # full-resolution (crop, origin) per embed_idx entry
+    hires_scale: np.ndarray | None = None            # (sx, sy) frame -> full-resolution coordinates
+
+
 class RecognizerThread(threading.Thread):
     def __init__(self, camera, event_queue):
         super().__init__(daemon=True)
         self.camera = camera
         self.queue  = event_queue
 
-        # Load models
-        self.face_det = dg.load_model(
-            model_name             = FACE_DET_MODEL,
-            inference_host_address = INFERENCE_HOST,
-            zoo_url                = ZOO_URL
-        )
-        self.face_rec = dg.load_model(
-            model_name             = FACE_REC_MODEL,
-            inference_host_address = INFERENCE_HOST,
-            zoo_url                = ZOO_URL
-        )
-
-        # Populate AUTHORIZED once
-        fetch_authorized_faces()
+        # Models are loaded once per process and shared with enrollment
+        self.models = get_inference_service()
+
+        # Populate GALLERY from the local cache; the server sync runs in the background
+        load_authorized_faces()
+
+        # Stage queues and workers (started from run())
+        self.embed_q = DropOldestQueue(PIPELINE_QUEUE_SIZE, "embed")
+        self.match_q = DropOldestQueue(PIPELINE_QUEUE_SIZE, "match")
+        self.stages = [
+            Stage("embed", self._embed_stage, self.embed_q, self.match_q),
+            Stage("match", self._match_stage, self.match_q),
+        ]
+        self.stale_dropped = 0
+
+        # Motion gate and tracker are owned by the detect stage
+        self.motion = MotionGate()
+        self.tracker = FaceTracker()
+        self.embeds_skipped = 0
+        self.quality_skipped = 0
+
+        for q in (self.embed_q, self.match_q):
+            METRICS.gauge("pipeline_queue_depth", q.depth, queue=q.name)
+            METRICS.counter_fn("pipeline_queue_dropped", lambda q=q: q.dropped, queue=q.name)
+
+    def stats(self) -> dict:
+        """
+        Per-stage queue depth and drop counters.
+        """
+        return {
+            "embed_q": self.embed_q.stats(),
+            "match_q": self.match_q.stats(),
+            "stale_dropped": self.stale_dropped,
+            "motion": self.motion.stats(),
+            "tracks": len(self.tracker.tracks),
+            "embeds_skipped": self.embeds_skipped,
+            "quality_skipped": self.quality_skipped,
+            "processed": {st.name: st.processed for st in self.stages},
+        }
 
+    # ─── Stage 1: detection ──────────────────────────────────────────────
     def run(self):
-        last_unknown_emb = None
-        unknown_start_time = None
-        UNKNOWN_HOLD_TIME = 3.0
-        UNKNOWN_DIFF_THRESHOLD = 0.8  # Only reset timer if embedding is very different
+        for st in self.stages:
+            st.start()
+
+        seq = 0
+        next_stats = time.monotonic() + PIPELINE_STATS_INTERVAL_S
         while True:
-            frame = self.camera.get_frame()
+            # block until the camera publishes a frame we have not seen yet
+            last_seq = seq
+            seq, frame, hires, captured = self.camera.wait_for_frame(seq, CAMERA_WAIT_TIMEOUT_S)
+            now = time.monotonic()
+            if now >= next_stats:
+                print(f"[recognizer] pipeline stats: {self.stats()}")
+                next_stats = now + PIPELINE_STATS_INTERVAL_S
             if frame is None:
-                time.sleep(0.01)
-                unknown_start_time = None
-                last_unknown_emb = None
                 continue
+            if last_seq and seq - last_seq > 1:
+                # published while the detector was busy with an earlier frame
+                METRICS.inc("frames_dropped", seq - last_seq - 1, reason="camera")
+
+            # skip static scenes, but keep detecting while faces are tracked
+            if not self.motion.check(frame, now, force=self.tracker.has_active(now)):
+                METRICS.inc("frames_dropped", reason="static")
+                continue
+
+            job = FrameJob(frame=frame, captured=now, trace=Trace(seq, captured))
+            job.trace.mark("pickup", now)
+            boxes, scores, landmarks = self.models.detect(frame)
+            job.trace.mark("detect")
+
+            # keep detections whose box lies inside the frame
+            h, w = frame.shape[:2]
+            x1, y1, x2, y2 = boxes.astype(np.int32).T
+            inside = (0 <= x1) & (x1 < x2) & (x2 <= w) & (0 <= y1) & (y1 < y2) & (y2 <= h)
+            job.boxes, job.scores, job.landmarks = boxes[inside], scores[inside], landmarks[inside]
+
+            job.quality = detection_quality(job.boxes, job.scores, job.landmarks)
 
-            dets = self.face_det(frame).results
-            if not dets:
-                time.sleep(0.01)
-                unknown_start_time = None
-                last_unknown_emb = None
+            job.tracks = self.tracker.update(job.boxes, now)
+            job.trace.mark("track")
+            if not job.tracks:
+                if hires is not None:
+                    hires.release()
+                job.trace.finish("no_face")
                 continue
+            METRICS.inc("frames_detected")
+            METRICS.inc("faces_detected", len(job.tracks))
+            for i, track in enumerate(job.tracks):
+                if job.quality[i] < FACE_QUALITY_MIN:
+                    # defer: the track is reconsidered on its next good frame
+                    self.quality_skipped += 1
+                elif self.tracker.needs_embedding(track, now):
+                    self.tracker.mark_embedding(track, now)
+                    job.embed_idx.append(i)
+                else:
+                    self.embeds_skipped += 1
+            if hires is not None:
+                # copy just the faces to embed; the camera may reuse the
+                # buffer before the embed stage gets to this job
+                if job.embed_idx:
+                    job.rois = hires.crop(job.boxes[job.embed_idx])
+                    if job.rois is None:
+                        METRICS.inc("hires_missed")
+                    else:
+                        job.hires_scale = hires.scale
+                    job.trace.mark("hires")
+                hires.release()
+            self.embed_q.put(job)
 
-            det = dets[0]
-            lms = det.get("landmarks", [])
-            bbox = det.get("bbox", det.get("box", []))
-
-            if len(lms) == 5 and len(bbox) == 4:
-                x1, y1, x2, y2 = map(int, bbox)
-                h, w = frame.shape[:2]
-                if 0 <= x1 < x2 <= w and 0 <= y1 < y2 <= h:
-                    pts  = [lm_["landmark"] for lm_ in lms]
-                    face = align_and_crop(frame, pts)
-
-                    res = self.face_rec(face).results
-                    emb = res[0].get("data", [[None]])[0]
-                    if emb is not None:
-                        e = np.array(emb, dtype=np.float32)
-                        e /= np.linalg.norm(e)
-
-                        # find best match
-                        best_sim, best_name = 0.0, None
-                        for name, vec, _ in AUTHORIZED:
-                            vec_norm = vec / np.linalg.norm(vec)
-                            sim = float(np.dot(e, vec_norm))
-                            if sim > best_sim:
-                                best_sim, best_name = sim, name
-
-                        # only emit events for clear cases:
-                        if best_sim >= THRESHOLD:
-                            self.queue.put(("recognized", best_name, frame))
-                            unknown_start_time = None
-                            last_unknown_emb = None
-                        elif best_sim <= UNKNOWN_SIM_THRESHOLD:
-                            # If new unknown or embedding changed significantly, reset timer
-                            if last_unknown_emb is None or np.linalg.norm(e - last_unknown_emb) > UNKNOWN_DIFF_THRESHOLD:
-                                unknown_start_time = time.time()
-                                last_unknown_emb = e
-                                print("[recognizer] new unknown detected, timer started")
-                            else:
-                                # If same unknown, check hold time
-                                if unknown_start_time and (time.time() - unknown_start_time) >= UNKNOWN_HOLD_TIME:
-                                    self.queue.put(("unknown", e.tolist(), frame))
-                                    print("[recognizer] unknown in sight > 3s, event sent")
-                                    unknown_start_time = None  # Only send once per sighting
-                                    last_unknown_emb = None
-                        else:
-                            unknown_start_time = None
-                            last_unknown_emb = None
+    # ─── Stage 2: align + embed ──────────────────────────────────────────
+    def _embed_stage(self, job: FrameJob) -> FrameJob | None:
+        # drop frames that waited too long rather than building a backlog
+        t = job.trace.mark("embed_queue")
+        if t - job.captured > PIPELINE_MAX_LATENCY_S:
+            self.stale_dropped += 1
+            METRICS.inc("frames_dropped", reason="stale")
+            return None
+
+        # align (from the full-resolution face regions if there are any),
+        # then drop crops that are too blurred to embed reliably
+        embed_idx = []
+        for k, i in enumerate(job.embed_idx):
+            if job.rois is not None:
+                roi, origin = job.rois[k]
+                face = align_and_crop(roi, job.landmarks[i] * job.hires_scale - origin)
             else:
-                unknown_start_time = None
-                last_unknown_emb = None
-            time.sleep(0.01)
+                face = align_and_crop(job.frame, job.landmarks[i])
+            weight = float(job.quality[i]) * sharpness_quality(face)
+            if weight < FACE_QUALITY_MIN:
+                self.quality_skipped += 1
+                continue
+            embed_idx.append(i)
+            job.faces.append(face)
+            job.weights.append(weight)
+        job.embed_idx = embed_idx
+        job.trace.mark("align")
 
+        if job.faces:
+            job.embs = self.models.embed(job.faces)
+            job.trace.mark("embed")
+            METRICS.inc("faces_embedded", len(job.faces))
+        return job
 
+    # ─── Stage 3: match + decision ───────────────────────────────────────
+    def _match_stage(self, job: FrameJob) -> None:
+        now = job.captured
+        job.trace.mark("match_queue")
 
+        # fold new embeddings into their tracks and match the aggregates
+        refreshed = []
+        if job.embs is not None and len(job.embs):
+            for i, e, face, weight in zip(job.embed_idx, job.embs, job.faces, job.weights):
+                if e.any():
+                    track = job.tracks[i]
+                    track.emb = e
+                    track.acc.add(e, weight)
+                    if weight >= track.face_quality:
+                        track.face, track.face_quality = face, weight
+                    refreshed.append(track)
+        aggregates = [t.acc.mean() for t in refreshed]
+        refreshed = [t for t, agg in zip(refreshed, aggregates) if agg is not None]
+        if refreshed:
+            names, sims = GALLERY.match_many([agg for agg in aggregates if agg is not None])
+            for track, name, sim in zip(refreshed, names, sims):
+                track.sim = float(sim)
+                if sim >= THRESHOLD:
+                    if track.name != name:
+                        track.recognized_reported = False
+                    track.name, track.decided = name, True
+                elif sim <= UNKNOWN_SIM_THRESHOLD or track.acc.total >= track.acc.window:
+                    # clearly unknown, or still borderline after a full window
+                    track.name, track.decided = None, True
+                else:
+                    # borderline: gather more evidence
+                    track.name, track.decided = None, False
 
+        events = []
+        for i, track in enumerate(job.tracks):
+            # recognized: emit once the track has been in view RECOGNIZED_DELAY,
+            # and again whenever a periodic refresh confirms the identity
+            if track.name is not None:
+                track.unknown_since = None
+                if track.dwell(now) >= RECOGNIZED_DELAY and (
+                        not track.recognized_reported or track in refreshed):
+                    events.append(("recognized", track.name, job.frame))
+                    track.recognized_reported = True
+                continue
+
+            # per-track unknown dwell timers, so several unknowns can be timed at once
+            if not track.decided:
+                track.unknown_since = None
+                continue
+            if track.unknown_since is None:
+                track.unknown_since = now
+                print(f"[recognizer] new unknown on track {track.id}, timer started")
+            elif not track.unknown_reported and now - track.unknown_since >= UNKNOWN_DELAY:
+                # copy: the camera ring reuses this buffer once the pipeline moves on;
+                # cropping and encoding happen later on the notifier thread
+                events.append(("unknown", track.acc.mean().tolist(), job.frame.copy(),
+                               job.boxes[i].copy(), track.face))
+                print(f"[recognizer] unknown on track {track.id} in sight > {UNKNOWN_DELAY}s, event sent")
+                track.unknown_reported = True  # Only send once per track
 
+        job.trace.mark("match")
+        job.trace.finish()
+        for evt in events:
+            self.queue.put(evt + (job.trace.copy(),))
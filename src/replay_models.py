@@ -0,0 +1,146 @@
+# replay_models.py
+"""
+Stand-in for degirum models that runs the model's real PythonFile
+postprocessor (SCRFD decode/NMS, ArcFace dequantize) on recorded raw output
+tensors instead of a Hailo device.
+
+Recordings live in MODEL_REPLAY_DIR/<model name>/*.npz, one inference per
+file, written by save_recording(): arrays tensor_0..tensor_{n-1} plus a
+JSON "details" entry with each tensor's quantization, index and name. Files
+are replayed in name order, cycling. synthetic_recording() produces
+shape-correct quantized tensors from the model JSON when no recordings are
+available (e.g. for benchmarks).
+"""
+import glob
+import importlib.util
+import itertools
+import json
+import os
+import threading
+import numpy as np
+
+
+class ReplayResult:
+    """Minimal equivalent of a degirum inference result."""
+    __slots__ = ("results", "image")
+
+    def __init__(self, results, image=None):
+        self.results = results
+        self.image = image
+
+
+def load_model_config(model_name: str, zoo_dir: str) -> tuple[dict, str]:
+    """
+    :return: (model JSON with LabelsPath made absolute, model directory)
+    """
+    model_dir = os.path.join(zoo_dir, model_name)
+    with open(os.path.join(model_dir, f"{model_name}.json")) as f:
+        config = json.load(f)
+    post = config.get("POST_PROCESS", [{}])[0]
+    if post.get("LabelsPath"):
+        post["LabelsPath"] = os.path.join(model_dir, post["LabelsPath"])
+    return config, model_dir
+
+
+def load_postprocessor(model_name: str, zoo_dir: str):
+    """
+    Instantiate the PostProcessor class from the model's PythonFile.
+    """
+    config, model_dir = load_model_config(model_name, zoo_dir)
+    python_file = config.get("POST_PROCESS", [{}])[0].get("PythonFile")
+    if not python_file:
+        raise ValueError(f"{model_name} has no PythonFile postprocessor to replay")
+    spec = importlib.util.spec_from_file_location(
+        f"replay_{model_name.replace('-', '_').replace('.', '_')}",
+        os.path.join(model_dir, python_file))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.PostProcessor(json.dumps(config))
+
+
+def save_recording(path: str, tensor_list: list, details_list: list) -> None:
+    """
+    Store one inference's raw output tensors (e.g. captured inside a
+    postprocessor's forward() on the Pi) in the replay format.
+    """
+    details = [{"quantization": [np.ravel(d["quantization"][0]).tolist(),
+                                 np.ravel(d["quantization"][1]).tolist()],
+                "index": d.get("index", i), "name": d.get("name", f"tensor_{i}")}
+               for i, d in enumerate(details_list)]
+    np.savez(path, details=json.dumps(details),
+             **{f"tensor_{i}": np.asarray(t) for i, t in enumerate(tensor_list)})
+
+
+def load_recording(path: str) -> tuple[list, list]:
+    with np.load(path) as data:
+        details = json.loads(str(data["details"]))
+        tensors = [data[f"tensor_{i}"] for i in range(len(details))]
+    return tensors, details
+
+
+def synthetic_recording(model_name: str, zoo_dir: str, faces: int = 2,
+                        rng: np.random.Generator | None = None) -> tuple[list, list]:
+    """
+    Random quantized output tensors with the model's output layout.
+
+    SCRFD models get `faces` anchors with a high score in the middle stride;
+    everything else gets noise.
+    """
+    rng = rng if rng is not None else np.random.default_rng(0)
+    config, _ = load_model_config(model_name, zoo_dir)
+    pre = config["PRE_PROCESS"][0]
+    post = config.get("POST_PROCESS", [{}])[0]
+    tensors, details = [], []
+    if post.get("OutputPostprocessType") == "Detection":
+        width, height = pre.get("InputW", 640), pre.get("InputH", 640)
+        strides = post.get("Strides", [8, 16, 32])
+        anchors = len(post.get("AnchorConfig", {}).get("MinSizes", [[16, 32]])[0])
+        # (channels, (scale, zero point), value range): box distances are
+        # positive (0.4-2.1 strides), landmark offsets signed
+        layout = ((4, (0.05, 128), (136, 170)),     # box
+                  (1, (1 / 255, 0), (0, 40)),       # score
+                  (10, (0.08, 120), (110, 146)))    # landmarks
+        for branch, stride in enumerate(strides):
+            h, w = height // stride, width // stride
+            for channels, quant, (low, high) in layout:
+                t = rng.integers(low, high, (1, h, w, anchors * channels), dtype=np.uint8)
+                if channels == 1 and branch == len(strides) // 2:
+                    t.reshape(-1)[rng.choice(t.size, faces, replace=False)] = 230
+                details.append({"quantization": [[quant[0]], [quant[1]]],
+                                "index": len(tensors), "name": f"output_{len(tensors)}"})
+                tensors.append(t)
+    else:
+        dim = post.get("EmbeddingSize", 512)
+        tensors.append(rng.integers(0, 255, (1, 1, 1, dim), dtype=np.uint8))
+        details.append({"quantization": [[0.02], [128]], "index": 0, "name": "output_0"})
+    return tensors, details
+
+
+class ReplayModel:
+    def __init__(self, model_name: str, zoo_dir: str, replay_dir: str | None = None):
+        """
+        :param model_name: model directory name in the zoo
+        :param zoo_dir: local model zoo (same as ZOO_URL for @local inference)
+        :param replay_dir: directory containing <model_name>/*.npz recordings;
+                           synthetic tensors are used if there are none
+        """
+        self.model_name = model_name
+        self.postprocessor = load_postprocessor(model_name, zoo_dir)
+        paths = sorted(glob.glob(os.path.join(replay_dir or "", model_name, "*.npz")))
+        if paths:
+            recordings = [load_recording(p) for p in paths]
+        else:
+            print(f"[replay] No recordings for {model_name}, using synthetic tensors")
+            rng = np.random.default_rng(0)
+            recordings = [synthetic_recording(model_name, zoo_dir, rng=rng) for _ in range(8)]
+        self._recordings = itertools.cycle(recordings)
+        self._lock = threading.Lock()
+
+    def __call__(self, image) -> ReplayResult:
+        with self._lock:
+            tensors, details = next(self._recordings)
+        return ReplayResult(self.postprocessor.forward(tensors, details), image)
+
+    def predict_batch(self, images):
+        for image in images:
+            yield self(image)
@@ -1,27 +1,36 @@
 # servo.py
 """
 Servo control module for door locking mechanism.
-Provides initialization, movement, and cleanup of the servo via RPi.GPIO.
+Provides initialization, movement, and cleanup of the servo via RPi.GPIO
+(or any object with the same API, e.g. fake_gpio.FakeGPIO).
+
+set_angle()/release() only change the PWM signal and return immediately;
+timing the motion is up to the caller (see door_controller.DoorController).
 """
-import RPi.GPIO as GPIO
 import time
 import atexit
 from config import SERVO_PIN, PWM_FREQUENCY, OPEN_ANGLE, CLOSED_ANGLE, HOLD_TIME
 
-# Internal PWM handle
+# Internal GPIO module and PWM handle
+_gpio = None
 _pwm = None
 
 # ─── Initialization ──────────────────────────────────────────────────────────
-def init_servo(pin: int = SERVO_PIN) -> None:
+def init_servo(pin: int = SERVO_PIN, gpio=None) -> None:
     """
     Initialize GPIO and PWM for servo control.
     Must be called before open_door() or close_door().
+
+    :param gpio: GPIO implementation to use; RPi.GPIO if None
     """
-    global _pwm
-    GPIO.setwarnings(False)
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(pin, GPIO.OUT, initial=GPIO.LOW)
-    _pwm = GPIO.PWM(pin, PWM_FREQUENCY)
+    global _gpio, _pwm
+    if gpio is None:
+        import RPi.GPIO as gpio
+    _gpio = gpio
+    _gpio.setwarnings(False)
+    _gpio.setmode(_gpio.BCM)
+    _gpio.setup(pin, _gpio.OUT, initial=_gpio.LOW)
+    _pwm = _gpio.PWM(pin, PWM_FREQUENCY)
     _pwm.start(0.0)
 
 # ─── Movement Helpers ────────────────────────────────────────────────────────
@@ -32,21 +41,38 @@ def _angle_to_duty_cycle(angle: float) -> float:
     return (angle / 18.0) + 2.0
 
 
-def _move_to(angle: float) -> None:
+def set_angle(angle: float) -> None:
     """
-    Move servo to specified angle and hold for HOLD_TIME, then zero pulses.
+    Start driving the servo towards `angle` (returns immediately).
     """
-    global _pwm
     if _pwm is None:
         init_servo()
-    dc = _angle_to_duty_cycle(angle)
     try:
-        _pwm.ChangeDutyCycle(dc)
-        time.sleep(HOLD_TIME)
+        _pwm.ChangeDutyCycle(_angle_to_duty_cycle(angle))
+    except Exception as e:
+        print(f"[servo] movement error: {e}")
+
+
+def release() -> None:
+    """
+    Stop sending pulses so the servo does not jitter while holding still.
+    """
+    if _pwm is None:
+        return
+    try:
         _pwm.ChangeDutyCycle(0.0)
     except Exception as e:
         print(f"[servo] movement error: {e}")
 
+
+def _move_to(angle: float) -> None:
+    """
+    Move servo to specified angle and hold for HOLD_TIME, then zero pulses.
+    """
+    set_angle(angle)
+    time.sleep(HOLD_TIME)
+    release()
+
 # ─── Door Control API ───────────────────────────────────────────────────────
 def open_door() -> None:
     """Swing servo to OPEN_ANGLE position."""
@@ -62,13 +88,14 @@ def _cleanup() -> None:
     """
     Stop PWM and clean up GPIO on exit.
     """
-    global _pwm
+    if _gpio is None:
+        return
     try:
         if _pwm is not None:
             _pwm.stop()
     except Exception:
         pass
     finally:
-        GPIO.cleanup()
+        _gpio.cleanup()
 
 atexit.register(_cleanup)
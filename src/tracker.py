@@ -0,0 +1,210 @@
+# tracker.py
+"""
+Lightweight multi-object face tracker.
+
+FaceTracker assigns stable track IDs to SCRFD boxes across frames using IoU
+(with a centroid-distance fallback) against a constant-velocity prediction of
+each track. Each Track caches its identity decision so ArcFace only has to run
+when a track is new, on a periodic refresh, or when its box changed a lot.
+
+Each track also carries an EmbeddingAccumulator, so identity decisions are
+made on a quality-weighted mean of the last few embeddings rather than on a
+single frame.
+
+The detect stage owns the tracker and is the only caller of update(); the
+match stage only writes identity fields on the Track objects it is handed.
+"""
+import itertools
+import numpy as np
+
+from config import (
+    TRACK_IOU_THRESHOLD,
+    TRACK_CENTROID_GATE,
+    TRACK_MAX_AGE_S,
+    TRACK_REEMBED_INTERVAL_S,
+    TRACK_REEMBED_IOU,
+    TRACK_UNDECIDED_INTERVAL_S,
+    TRACK_EMBED_WINDOW,
+)
+
+# alpha-beta gains: a fixed-gain (steady-state) constant-velocity Kalman step
+_ALPHA = 0.6
+_BETA = 0.2
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoU of boxes a (N, 4) and b (M, 4) in x1, y1, x2, y2 form.
+    """
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class EmbeddingAccumulator:
+    """
+    Ring buffer of the last `window` embeddings with a running weighted sum,
+    so the aggregate costs O(D) per update regardless of window size.
+    """
+    def __init__(self, window: int = TRACK_EMBED_WINDOW):
+        self.window = max(1, window)
+        self._embs = None                 # (window, D), allocated on first add
+        self._weights = np.zeros(self.window, dtype=np.float32)
+        self._sum = None
+        self._next = 0
+        self.count = 0                    # embeddings currently held
+        self.total = 0                    # embeddings ever added
+
+    def add(self, emb: np.ndarray, weight: float = 1.0) -> None:
+        """Add one normalized embedding, evicting the oldest when full."""
+        if self._embs is None:
+            self._embs = np.zeros((self.window, emb.size), dtype=np.float32)
+            self._sum = np.zeros(emb.size, dtype=np.float32)
+        slot = self._next
+        if self.count == self.window:
+            self._sum -= self._weights[slot] * self._embs[slot]
+        else:
+            self.count += 1
+        self._embs[slot] = emb
+        self._weights[slot] = weight
+        self._sum += weight * self._embs[slot]
+        self._next = (slot + 1) % self.window
+        self.total += 1
+        if self._next == 0:
+            # re-derive the sum once per lap so float error cannot accumulate
+            self._sum = self._weights @ self._embs
+
+    def mean(self) -> np.ndarray | None:
+        """L2-normalized weighted mean, or None if empty or degenerate."""
+        if self._sum is None:
+            return None
+        norm = float(np.linalg.norm(self._sum))
+        return self._sum / norm if norm > 0 else None
+
+
+class Track:
+    def __init__(self, track_id: int, box: np.ndarray, now: float):
+        self.id = track_id
+        self.box = np.asarray(box, dtype=np.float32).copy()
+        self.velocity = np.zeros(4, dtype=np.float32)   # px / s per coordinate
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+
+        # identity cache, written by the match stage
+        self.name = None          # best gallery match, if recognized
+        self.sim = 0.0            # similarity of the last decision
+        self.decided = False      # True once recognized or clearly unknown
+        self.emb = None           # last normalized embedding
+        self.face = None          # best-quality aligned crop seen so far
+        self.face_quality = 0.0
+        self.acc = EmbeddingAccumulator()
+        self.recognized_reported = False
+
+        # re-embedding bookkeeping
+        self.last_embed_time = None
+        self.embed_box = None
+
+        # per-track unknown dwell timer
+        self.unknown_since = None
+        self.unknown_reported = False
+
+    def predict(self, now: float) -> np.ndarray:
+        """Box extrapolated to `now` with the current velocity."""
+        return self.box + self.velocity * (now - self.last_seen)
+
+    def correct(self, box: np.ndarray, now: float) -> None:
+        """Blend a new observation into position and velocity."""
+        dt = now - self.last_seen
+        predicted = self.predict(now)
+        residual = np.asarray(box, dtype=np.float32) - predicted
+        self.box = predicted + _ALPHA * residual
+        if dt > 0:
+            self.velocity = self.velocity + (_BETA / dt) * residual
+        self.last_seen = now
+        self.hits += 1
+
+    def dwell(self, now: float) -> float:
+        """Seconds this track has been in view."""
+        return now - self.first_seen
+
+
+class FaceTracker:
+    def __init__(self):
+        self.tracks: list[Track] = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes: np.ndarray, now: float) -> list[Track]:
+        """
+        Associate detections with tracks, start new tracks and expire old ones.
+
+        :param boxes: (N, 4) detections for this frame
+        :param now: time.monotonic() of the frame
+        :return: list of N tracks, one per detection in input order
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= TRACK_MAX_AGE_S]
+
+        assigned: list[Track | None] = [None] * len(boxes)
+        if self.tracks and len(boxes):
+            predicted = np.stack([t.predict(now) for t in self.tracks])
+            score = iou_matrix(predicted, boxes)
+
+            # centroid fallback for fast motion where boxes stop overlapping
+            pc = (predicted[:, :2] + predicted[:, 2:]) / 2
+            dc = (boxes[:, :2] + boxes[:, 2:]) / 2
+            diag = np.linalg.norm(predicted[:, 2:] - predicted[:, :2], axis=1)
+            dist = np.linalg.norm(pc[:, None] - dc[None], axis=2) / np.maximum(diag[:, None], 1.0)
+            near = (score < TRACK_IOU_THRESHOLD) & (dist < TRACK_CENTROID_GATE)
+            score = np.where(near, TRACK_IOU_THRESHOLD * (1.0 - dist / TRACK_CENTROID_GATE), score)
+            score[(score < TRACK_IOU_THRESHOLD) & ~near] = 0.0
+
+            # greedy assignment, best pair first
+            used = set()
+            for flat in np.argsort(-score, axis=None):
+                ti, di = np.unravel_index(flat, score.shape)
+                if score[ti, di] <= 0:
+                    break
+                if assigned[di] is not None or ti in used:
+                    continue
+                self.tracks[ti].correct(boxes[di], now)
+                assigned[di] = self.tracks[ti]
+                used.add(ti)
+
+        for di, track in enumerate(assigned):
+            if track is None:
+                track = Track(next(self._ids), boxes[di], now)
+                self.tracks.append(track)
+                assigned[di] = track
+        return assigned
+
+    def has_active(self, now: float) -> bool:
+        """True if any track was seen within TRACK_MAX_AGE_S."""
+        return any(now - t.last_seen <= TRACK_MAX_AGE_S for t in self.tracks)
+
+    @staticmethod
+    def needs_embedding(track: Track, now: float) -> bool:
+        """
+        True if the track is new, its identity is due for a refresh, or its
+        box moved/resized enough that the last embedding may be stale.
+        """
+        if track.last_embed_time is None:
+            return True
+        since = now - track.last_embed_time
+        if not track.decided:
+            return since >= TRACK_UNDECIDED_INTERVAL_S
+        if since >= TRACK_REEMBED_INTERVAL_S:
+            return True
+        return float(iou_matrix(track.box, track.embed_box)[0, 0]) < TRACK_REEMBED_IOU
+
+    @staticmethod
+    def mark_embedding(track: Track, now: float) -> None:
+        """Record that an embedding was scheduled for this track."""
+        track.last_embed_time = now
+        track.embed_box = track.box.copy()
@@ -1,71 +1,209 @@
 # ultrasonic.py
+"""
+UltrasonicThread ranges an HC-SR04 and posts "near"/"clear" state changes.
+
+In the default "edge" mode the echo pulse is timed from GPIO edge events on
+the time.monotonic_ns() clock (capture timestamps when the backend has them,
+see EchoTimer), so the thread sleeps instead of busy-waiting on GPIO.input
+and wall-clock jumps cannot corrupt a reading.
+"poll" mode keeps the busy-wait for backends without edge detection.
+
+Readings outside the sensor's range are discarded, the distance used for
+decisions is the median of the last ULTRASONIC_FILTER_WINDOW readings, and
+the state only changes back to "clear" above
+ULTRASONIC_THRESHOLD_CM + ULTRASONIC_HYSTERESIS_CM, so a reading hovering
+around the threshold does not flap.
+"""
 import threading
 import time
-import RPi.GPIO as GPIO
+from collections import deque
+import numpy as np
 
 from config import (
     ULTRASONIC_TRIG_PIN,
     ULTRASONIC_ECHO_PIN,
     ULTRASONIC_THRESHOLD_CM,
-    ULTRASONIC_HOLD_TIME_S,
-    ULTRASONIC_MEASURE_INTERVAL_S
+    ULTRASONIC_MEASURE_INTERVAL_S,
+    ULTRASONIC_MODE,
+    ULTRASONIC_FILTER_WINDOW,
+    ULTRASONIC_HYSTERESIS_CM,
+    ULTRASONIC_MIN_CM,
+    ULTRASONIC_MAX_CM,
+    ULTRASONIC_MAX_MISSES,
+    ULTRASONIC_ECHO_RISE_MAX_S,
 )
 
 # how long (s) we’re willing to wait for an echo change
-ECHO_TIMEOUT = 0.02  
+ECHO_TIMEOUT = 0.02
+SPEED_OF_SOUND_CM_S = 34300
+# longest echo worth timing: a round trip to ULTRASONIC_MAX_CM
+ECHO_MAX_WIDTH_S = 2 * ULTRASONIC_MAX_CM / SPEED_OF_SOUND_CM_S
+
+
+class EchoTimer:
+    """
+    Times one echo pulse from edge callbacks (called on the GPIO thread).
+
+    Callbacks run late on the GPIO library's thread, when a short echo may
+    already be over, so neither the pin level nor the time at callback says
+    reliably when an edge happened. The timer tracks the expected edge
+    instead (after arm() the first edge is the rising one, the second the
+    falling one, further edges are ignored until the next arm()) and uses
+    the edge's capture timestamp when the backend passes one as a second
+    callback argument (lgpio-style alert ticks, FakeGPIO). Without it, edges
+    are stamped on dispatch, and a reading whose callbacks arrived later
+    than the echo could have is rejected rather than reported with the
+    dispatch delay as its width.
+    """
+    def __init__(self, gpio, pin: int):
+        self.gpio = gpio
+        self.pin = pin
+        self.armed_ns = None
+        self.rise_ns = None
+        self.fall_ns = None
+        self.late = False
+        self.late_readings = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def arm(self) -> None:
+        with self._lock:
+            self.armed_ns = time.monotonic_ns()
+            self.rise_ns = self.fall_ns = None
+            self.late = False
+            self.done.clear()
+
+    def on_edge(self, channel, tick_ns: int | None = None) -> None:
+        """
+        :param tick_ns: time.monotonic_ns() at which the edge was captured,
+                        if the backend provides it
+        """
+        now = time.monotonic_ns() if tick_ns is None else tick_ns
+        with self._lock:
+            if self.armed_ns is None or now < self.armed_ns:
+                return      # left over from an earlier measurement
+            if self.rise_ns is None:
+                self.rise_ns = now
+                # the echo rises shortly after the trigger pulse
+                deadline = ULTRASONIC_ECHO_RISE_MAX_S
+            elif self.fall_ns is None:
+                self.fall_ns = now
+                deadline = ULTRASONIC_ECHO_RISE_MAX_S + ECHO_MAX_WIDTH_S
+                self.done.set()
+            else:
+                return
+            if tick_ns is None and now - self.armed_ns > deadline * 1e9:
+                self.late = True
+
+    def wait(self, timeout: float) -> float | None:
+        """
+        :return: pulse width in seconds, or None if no complete pulse arrived
+                 or its edges were dispatched too late to be timed
+        """
+        if not self.done.wait(timeout):
+            return None
+        with self._lock:
+            if self.late:
+                self.late_readings += 1
+                return None
+            return (self.fall_ns - self.rise_ns) / 1e9
+
 
 class UltrasonicThread(threading.Thread):
-    def __init__(self, command_queue):
+    def __init__(self, event_queue, gpio=None, mode: str = ULTRASONIC_MODE):
+        """
+        :param event_queue: receives ("near", dist) when an object comes within
+                            ULTRASONIC_THRESHOLD_CM and ("clear", dist) when it
+                            leaves; only state changes are posted
+        :param gpio: GPIO implementation (RPi.GPIO if None)
+        :param mode: "edge" (edge callbacks) or "poll" (busy-wait)
+        """
         super().__init__(daemon=True)
-        self.queue = command_queue
-        self.last_distance = None  # Track last valid distance
-        self._sensor_below_since = None
-        self._should_auto_close = False
-        GPIO.setwarnings(False)
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup([ULTRASONIC_TRIG_PIN], GPIO.OUT, initial=GPIO.LOW)
-        GPIO.setup([ULTRASONIC_ECHO_PIN], GPIO.IN)
+        if gpio is None:
+            import RPi.GPIO as gpio
+        self.gpio = gpio
+        self.queue = event_queue
+        self.mode = mode
+        self.last_distance = None  # Filtered distance (None while out of range)
+        self.near = False
+        self._readings = deque(maxlen=max(1, ULTRASONIC_FILTER_WINDOW))
+        self._misses = 0
+        self.measurements = 0
+        self.rejected = 0
+        gpio.setwarnings(False)
+        gpio.setmode(gpio.BCM)
+        gpio.setup([ULTRASONIC_TRIG_PIN], gpio.OUT, initial=gpio.LOW)
+        gpio.setup([ULTRASONIC_ECHO_PIN], gpio.IN)
+        self._echo = None
+        if mode == "edge":
+            self._echo = EchoTimer(gpio, ULTRASONIC_ECHO_PIN)
+            gpio.add_event_detect(ULTRASONIC_ECHO_PIN, gpio.BOTH, callback=self._echo.on_edge)
 
-    def measure_distance(self) -> float | None:
-        # trigger pulse
-        GPIO.output(ULTRASONIC_TRIG_PIN, True)
+    def _trigger(self) -> None:
+        self.gpio.output(ULTRASONIC_TRIG_PIN, True)
         time.sleep(10e-6)
-        GPIO.output(ULTRASONIC_TRIG_PIN, False)
+        self.gpio.output(ULTRASONIC_TRIG_PIN, False)
+
+    def measure_distance(self) -> float | None:
+        """
+        One raw reading in cm, or None if the echo timed out.
+        """
+        if self._echo is not None:
+            self._echo.arm()
+            self._trigger()
+            duration = self._echo.wait(2 * ECHO_TIMEOUT)
+            if duration is None:
+                return None
+            return (duration * SPEED_OF_SOUND_CM_S) / 2  # cm
 
+        self._trigger()
+        gpio = self.gpio
         # wait for echo to go high, with timeout
-        start_time = time.time()
-        while GPIO.input(ULTRASONIC_ECHO_PIN) == 0:
-            if time.time() - start_time > ECHO_TIMEOUT:
+        start_time = time.monotonic_ns()
+        while gpio.input(ULTRASONIC_ECHO_PIN) == 0:
+            if time.monotonic_ns() - start_time > ECHO_TIMEOUT * 1e9:
                 return None
-        t0 = time.time()
+        t0 = time.monotonic_ns()
 
         # wait for echo to go low, with timeout
-        while GPIO.input(ULTRASONIC_ECHO_PIN) == 1:
-            if time.time() - t0 > ECHO_TIMEOUT:
+        while gpio.input(ULTRASONIC_ECHO_PIN) == 1:
+            if time.monotonic_ns() - t0 > ECHO_TIMEOUT * 1e9:
                 return None
-        t1 = time.time()
+        t1 = time.monotonic_ns()
 
-        duration = t1 - t0
-        return (duration * 34300) / 2  # cm
+        duration = (t1 - t0) / 1e9
+        return (duration * SPEED_OF_SOUND_CM_S) / 2  # cm
 
-    def should_auto_close(self):
-        return self._should_auto_close
+    def update(self, raw: float | None) -> float | None:
+        """
+        Feed one raw reading through the range check and median filter and
+        post a state change if the filtered distance crosses the threshold.
 
-    def reset_auto_close(self):
-        self._sensor_below_since = None
-        self._should_auto_close = False
+        :return: the filtered distance (None while out of range)
+        """
+        self.measurements += 1
+        if raw is None or not ULTRASONIC_MIN_CM <= raw <= ULTRASONIC_MAX_CM:
+            self.rejected += 1
+            self._misses += 1
+            # a few dropped echoes are noise; a run of them means nothing in range
+            if self._misses >= ULTRASONIC_MAX_MISSES:
+                self._readings.clear()
+        else:
+            self._misses = 0
+            self._readings.append(raw)
+        dist = float(np.median(self._readings)) if self._readings else None
+        self.last_distance = dist
+
+        if self.near:
+            near = dist is not None and dist <= ULTRASONIC_THRESHOLD_CM + ULTRASONIC_HYSTERESIS_CM
+        else:
+            near = dist is not None and dist <= ULTRASONIC_THRESHOLD_CM
+        if near != self.near:
+            self.near = near
+            self.queue.put(("near" if near else "clear", dist))
+        return dist
 
     def run(self):
         while True:
-            dist = self.measure_distance()
-            self.last_distance = dist
-            now = time.time()
-            if dist is not None and dist <= ULTRASONIC_THRESHOLD_CM:
-                if self._sensor_below_since is None:
-                    self._sensor_below_since = now
-                elif (now - self._sensor_below_since) >= ULTRASONIC_HOLD_TIME_S:
-                    self._should_auto_close = True
-            else:
-                self._sensor_below_since = None
-                self._should_auto_close = False
+            self.update(self.measure_distance())
             time.sleep(ULTRASONIC_MEASURE_INTERVAL_S)
@@ -2,65 +2,102 @@
 """
 Utility functions and shared state for the Face Door Control project.
 Includes:
-- Global AUTHORIZED list of (name, vector, image)
-- fetch_authorized_faces(): populate AUTHORIZED from API
+- Global GALLERY index of authorized (name, vector, image) entries
+- load_authorized_faces(): load the on-disk cache, then sync with the API in the background
+- letterbox(): fit an image into the detector input size
+- detections_to_arrays(): SCRFD results as boxes/scores/landmarks arrays
 - align_and_crop(): align face based on landmarks
+- embedding_from_results(): normalized ArcFace embedding from model results
 - encode_image_to_base64(): encode images to base64 for sending
 """
 
+import threading
 import numpy as np
 import cv2
-import requests
 import base64
-from config import FACE_DATA_URL
+from gallery import GalleryIndex
+from gallery_store import load_gallery
+from gallery_sync import GallerySyncThread
 
-# Global list of known faces: list of tuples (name: str, vector: np.ndarray, image: np.ndarray)
-AUTHORIZED: list[tuple[str, np.ndarray, np.ndarray]] = []
+# Global index of known faces (normalized embeddings + names + images)
+GALLERY = GalleryIndex()
 
-def fetch_authorized_faces() -> None:
+# Background server sync, shared by everything that loads the gallery
+_SYNC_THREAD: GallerySyncThread | None = None
+_SYNC_LOCK = threading.Lock()
+
+def load_authorized_faces() -> GallerySyncThread:
+    """
+    Populate GALLERY from the local cache right away, then keep it in sync
+    with the server from a background thread (started once per process).
     """
-    Fetch authorized face embeddings from the server and populate AUTHORIZED.
-    Expects JSON with 'results' list of entries having 'name', 'vector_data', and 'face_image_base64'.
+    global _SYNC_THREAD
+    with _SYNC_LOCK:
+        if _SYNC_THREAD is None:
+            if not load_gallery(GALLERY):
+                print("[utils] No gallery cache, waiting for server sync")
+            _SYNC_THREAD = GallerySyncThread(GALLERY)
+            _SYNC_THREAD.start()
+        return _SYNC_THREAD
+
+def letterbox(img: np.ndarray, size: tuple[int, int] = (640, 640)) -> tuple[np.ndarray, float, tuple[int, int]]:
     """
-    global AUTHORIZED
-    AUTHORIZED.clear()
-    try:
-        resp = requests.get(FACE_DATA_URL, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-    except requests.RequestException as e:
-        print(f"[utils] Error fetching authorized faces: {e}")
-        return
-
-    entries = data.get("results") if isinstance(data, dict) else data
-    for entry in entries or []:
-        name = entry.get("name")
-        vec  = entry.get("vector_data", entry.get("face_vector", []))
-        face_b64 = entry.get("face_image_base64")
-        img = None
-        if face_b64:
-            try:
-                if face_b64.startswith("data:image"):
-                    face_b64 = face_b64.split(",", 1)[1]
-                img_bytes = base64.b64decode(face_b64)
-                img_array = np.frombuffer(img_bytes, np.uint8)
-                img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            except Exception as ex:
-                print(f"[utils] Skipping invalid face image for {name}: {ex}")
-        if name and isinstance(vec, list):
-            try:
-                arr = np.array(vec, dtype=np.float32)
-                AUTHORIZED.append((name, arr, img))  # store image as well
-            except Exception as ex:
-                print(f"[utils] Skipping invalid vector for {name}: {ex}")
-    print(f"[utils] Loaded {len(AUTHORIZED)} authorized faces")
-
-def align_and_crop(img: np.ndarray, landmarks: list[list[float]], size: int = 112) -> np.ndarray:
+    Resize img to fit inside `size` keeping aspect ratio, padding the rest with black.
+
+    :param img: source image (H x W x C)
+    :param size: (width, height) of the output canvas
+    :return: (canvas, scale, (pad_x, pad_y)); model coordinates map back to
+             img coordinates as (p - pad) / scale
+    """
+    h, w = img.shape[:2]
+    out_w, out_h = size
+    if (w, h) == (out_w, out_h):
+        return img, 1.0, (0, 0)
+    scale = min(out_w / w, out_h / h)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    pad_x, pad_y = (out_w - new_w) // 2, (out_h - new_h) // 2
+    canvas = np.zeros((out_h, out_w) + img.shape[2:], dtype=img.dtype)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(
+        img, (new_w, new_h), interpolation=cv2.INTER_AREA
+    )
+    return canvas, scale, (pad_x, pad_y)
+
+def detections_to_arrays(results: list, scale: float = 1.0,
+                         pad: tuple[int, int] = (0, 0)) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Convert SCRFD results for one image into arrays (highest score first).
+
+    Accepts both the compact output mode (a dict of arrays) and the classic
+    list of per-detection dicts.
+
+    :param results: model(...).results
+    :param scale, pad: letterbox parameters to undo (see letterbox())
+    :return: boxes (N, 4), scores (N,), landmarks (N, 5, 2), all float32
+    """
+    if results and "boxes" in results[0]:
+        res = results[0]
+        boxes, scores, lms = res["boxes"], res["scores"], res["landmarks"]
+        if lms.shape[1] != 5:  # model without landmark outputs
+            boxes, scores, lms = boxes[:0], scores[:0], np.empty((0, 5, 2), np.float32)
+    else:
+        dets = [d for d in results or []
+                if len(d.get("landmarks", [])) == 5 and len(d.get("bbox", d.get("box", []))) == 4]
+        boxes = np.array([d.get("bbox", d.get("box")) for d in dets], dtype=np.float32).reshape(-1, 4)
+        scores = np.array([d.get("score", 0.0) for d in dets], dtype=np.float32)
+        lms = np.array([[lm["landmark"] for lm in d["landmarks"]] for d in dets],
+                       dtype=np.float32).reshape(-1, 5, 2)
+    if scale != 1.0 or pad != (0, 0):
+        offset = np.asarray(pad, dtype=np.float32)
+        boxes = (boxes.reshape(-1, 2, 2) - offset).reshape(-1, 4) / scale
+        lms = (lms - offset) / scale
+    return boxes, scores, lms
+
+def align_and_crop(img: np.ndarray, landmarks: list[list[float]] | np.ndarray, size: int = 112) -> np.ndarray:
     """
     Align and crop a face from img using 5-point landmarks.
 
     :param img: source image (H x W x C)
-    :param landmarks: list of 5 [x,y] points
+    :param landmarks: 5 [x,y] points (list or (5, 2) array)
     :param size: output square size (pixels)
     :return: aligned, cropped image of shape (size, size, C)
     """
@@ -73,11 +110,33 @@ def align_and_crop(img: np.ndarray, landmarks: list[list[float]], size: int = 11
         [70.7299, 92.2041],
     ], dtype=np.float32) * (size / 112.0)
 
-    pts = np.array(landmarks, dtype=np.float32)
+    pts = np.asarray(landmarks, dtype=np.float32)
     M, _ = cv2.estimateAffinePartial2D(pts, ref)
     aligned = cv2.warpAffine(img, M, (size, size), flags=cv2.INTER_LINEAR)
     return aligned
 
+def embedding_from_results(results: list) -> np.ndarray | None:
+    """
+    Extract the L2-normalized float32 embedding from ArcFace results.
+
+    When the dequantizer already returned a normalized array (see
+    OutputNormalizedArray) the row is returned as-is, without a copy.
+
+    :param results: model(...).results
+    :return: (D,) embedding, or None if the model returned no usable data
+    """
+    if not results:
+        return None
+    res = results[0]
+    data = res.get("data")
+    if data is None or not len(data) or data[0] is None:
+        return None
+    emb = np.asarray(data[0], dtype=np.float32)
+    if res.get("normalized"):
+        return emb
+    norm = float(np.linalg.norm(emb))
+    return emb / norm if norm > 0 else None
+
 def encode_image_to_base64(img: np.ndarray) -> str:
     """
     Encode a BGR or RGB image to base64 JPEG string with data URI prefix.
@@ -2,18 +2,18 @@
 import threading
 import json
 import websocket
-import base64
-import cv2
-import numpy as np
-import requests
-from utils import AUTHORIZED, align_and_crop, encode_image_to_base64  # <-- Import align_and_crop and encode_image_to_base64 from utils
-from config import WS_URL, FACE_DATA_URL
+from utils import GALLERY
+from config import WS_URL
+from enrollment import EnrollmentPool
+from gallery_store import request_save
 
 class WSClientThread(threading.Thread):
     def __init__(self, command_queue):
         super().__init__(daemon=True)
         self.queue = command_queue
         self.ws = None  # Store ws instance for sending messages
+        # enrollment runs on worker threads so on_message never blocks on inference
+        self.enrollment = EnrollmentPool(self.send_enrollment_result)
 
     def send_closed_status(self):
         if self.ws:
@@ -33,63 +33,24 @@ class WSClientThread(threading.Thread):
             except Exception as e:
                 print(f"[ws_client] Failed to send OPENED status: {e}")
 
-    def handle_face_recognition_request(self, data):
+    def send_json(self, msg: dict) -> bool:
+        """
+        Send a JSON message over the websocket (safe from any thread).
 
-        b64img = data.get("face_image_base64")
-        request_id = data.get("request_id")
-        name = data.get("name")
-        user_id = data.get("user_id", 1)  # fallback if not provided
-        device_id = data.get("device_id", "cam01")
-        print("NAME:",name)
-        if not b64img:
-            print("[ws_client] No image data in request")
-            return
+        :return: False if not connected or the send failed
+        """
+        if not self.ws:
+            return False
         try:
-            if b64img.startswith("data:image"):
-                b64img = b64img.split(",", 1)[1]
-            img_bytes = base64.b64decode(b64img)
-            img_array = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+            self.ws.send(json.dumps(msg))
+            return True
         except Exception as e:
-            print(f"[ws_client] Failed to decode image: {e}")
-            return
-        # Import recognizer models
-        from recognizer import RecognizerThread
-        recog = RecognizerThread(None, None)
-        dets = recog.face_det(img).results
-        if not dets:
-            print("[ws_client] No face detected in image")
-            return
-        det = dets[0]
-        lms = det.get("landmarks", [])
-        bbox = det.get("bbox", det.get("box", []))
-        if len(lms) == 5 and len(bbox) == 4:
-            pts = [lm_["landmark"] for lm_ in lms]
-            face = align_and_crop(img, pts)  # <-- Use align_and_crop from utils
-            res = recog.face_rec(face).results
-            emb = res[0].get("data", [[None]])[0]
-            if emb is not None:
-                e = np.array(emb, dtype=np.float32)
-                e /= np.linalg.norm(e)
-                face_b64 = encode_image_to_base64(face)
-                AUTHORIZED.append((name, e, face))
-                payload = {
-                    "name": name,
-                    "user": user_id,
-                    "vector_data": e.tolist(),
-                    "face_image_base64": face_b64,
-                    "metadata": {"source": "camera", "device_id": device_id, "request_id": request_id}
-                }
-                try:
-                    resp = requests.post(FACE_DATA_URL, json=payload, timeout=5)
-                    resp.raise_for_status()
-                    print(f"[ws_client] Face vector uploaded ({resp.status_code})")
-                except Exception as ex:
-                    print(f"[ws_client] Failed to upload face vector: {ex}")
-            else:
-                print("[ws_client] No embedding extracted from face")
-        else:
-            print("[ws_client] Invalid face landmarks or bbox")
+            print(f"[ws_client] Failed to send {msg.get('type')}: {e}")
+            return False
+
+    def send_enrollment_result(self, result: dict):
+        if self.send_json(result):
+            print(f"[ws_client] Sent enrollment result for request {result.get('request_id')}: {result['status']}")
 
     def on_message(self, ws, message):
         """
@@ -105,16 +66,18 @@ class WSClientThread(threading.Thread):
             return
 
         if data.get("type") == "face_recognition_request":
-            self.handle_face_recognition_request(data)
+            print(f"[ws_client] Enrollment request for '{data.get('name')}'")
+            self.enrollment.submit(data)
             return
 
         if data.get("type") == "face_vector_deleted":
             # Remove authorized face by name (or other unique key)
             name = data.get("name")
             if name:
-                before = len(AUTHORIZED)
-                AUTHORIZED[:] = [entry for entry in AUTHORIZED if entry[0] != name]
-                after = len(AUTHORIZED)
+                before = len(GALLERY)
+                GALLERY.remove(name)
+                after = len(GALLERY)
+                request_save(GALLERY)   # written by the background saver
                 print(f"[ws_client] Deleted authorized face '{name}'. Before: {before}, After: {after}")
             else:
                 print("[ws_client] face_vector_delete received without a name.")
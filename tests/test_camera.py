@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+
+from camera import FileCameraThread, HiresFrame, unpad_i420
+from utils import align_and_crop
+
+
+def test_hires_roi_aligns_like_the_full_image():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (1280, 1280, 3), dtype=np.uint8)
+    hires = HiresFrame((2.0, 2.0), image=image)
+    box = np.array([[200, 220, 300, 340]], dtype=np.float32)
+    landmarks = np.array([[230, 260], [270, 260], [250, 285], [235, 310], [265, 310]],
+                         dtype=np.float32)
+
+    (roi, origin), = hires.crop(box)
+    assert roi.shape[0] < image.shape[0] and roi.shape[1] < image.shape[1]
+    face = align_and_crop(roi, landmarks * hires.scale - origin)
+    full = align_and_crop(image, landmarks * hires.scale)
+    # same warp up to interpolation rounding
+    assert np.abs(face.astype(np.int16) - full).max() <= 1
+
+    hires.release()
+    assert hires.crop(box) is None
+
+
+def test_video_file_frames_are_all_published(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (320, 240))
+    for i in range(5):
+        writer.write(np.full((240, 320, 3), i * 40, np.uint8))
+    writer.release()
+
+    camera = FileCameraThread(path, fps=0, loop=False)
+    camera.run()
+    assert camera.finished.is_set() and camera.seq == 5
+
+
+def test_unpad_i420_matches_unpadded_conversion():
+    rng = np.random.default_rng(0)
+    w, h, stride = 200, 120, 256
+    i420 = rng.integers(0, 256, (h * 3 // 2, w), dtype=np.uint8)
+    y, chroma = i420[:h], i420[h:].reshape(-1)
+    u, v = chroma[:h * w // 4].reshape(h // 2, w // 2), chroma[h * w // 4:].reshape(h // 2, w // 2)
+
+    # the same image with every row padded to the stride, as the ISP maps it
+    padded = np.zeros((h * 3 // 2, stride), np.uint8)
+    padded[:h, :w] = y
+    planes = padded[h:].reshape(-1)
+    cs = stride // 2
+    planes[:h // 2 * cs].reshape(h // 2, cs)[:, :w // 2] = u
+    planes[h // 2 * cs:].reshape(h // 2, cs)[:, :w // 2] = v
+
+    out = unpad_i420(padded, w, h, stride, np.empty_like(i420))
+    assert np.array_equal(out, i420)
@@ -0,0 +1,79 @@
+import time
+
+import servo
+from config import SERVO_PIN, OPEN_ANGLE, CLOSED_ANGLE
+from door_controller import DoorController, CLOSED, OPENING, OPEN, CLOSING
+from fake_gpio import FakeGPIO
+
+MOTION_S = 0.05
+OPEN_DUTY = servo._angle_to_duty_cycle(OPEN_ANGLE)
+CLOSED_DUTY = servo._angle_to_duty_cycle(CLOSED_ANGLE)
+
+
+def _door():
+    """A started controller on fake PWM, with its recorded state changes."""
+    gpio = FakeGPIO()
+    door = DoorController(gpio=gpio, motion_time=MOTION_S, notify=False)
+    changes = []
+    door.add_listener(lambda old, new: changes.append((old, new)))
+    door.start()
+    assert door.wait_idle(1.0)
+    return door, gpio.pwms[SERVO_PIN], changes
+
+
+def _wait_for(cond, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_open_then_close():
+    door, pwm, changes = _door()
+    assert door.open()
+    assert door.wait_idle(1.0) and door.state == OPEN
+    assert door.close()
+    assert door.wait_idle(1.0) and door.state == CLOSED
+
+    # the initial close is reported too: listeners are wired before start()
+    assert changes == [(CLOSING, CLOSED), (CLOSED, OPENING), (OPENING, OPEN),
+                       (OPEN, CLOSING), (CLOSING, CLOSED)]
+    duties = [d for _, d in pwm.history]
+    assert duties == [0.0, CLOSED_DUTY, 0.0, OPEN_DUTY, 0.0, CLOSED_DUTY, 0.0]
+    # every move is driven for the full motion time, then the pulses stop
+    times = [t for t, _ in pwm.history]
+    for start, stop in zip(times[1::2], times[2::2]):
+        assert stop - start >= MOTION_S
+
+
+def test_repeated_open_requests_are_merged():
+    door, pwm, changes = _door()
+    before = len(pwm.history)
+    assert door.open()
+    assert not door.open()
+    assert not door.open()
+    assert door.wait_idle(1.0) and door.state == OPEN
+    assert not door.open()
+
+    assert door.merged == 3
+    assert [d for _, d in pwm.history[before:]] == [OPEN_DUTY, 0.0]
+    assert changes[1:] == [(CLOSED, OPENING), (OPENING, OPEN)]
+
+
+def test_open_while_closing_reverses():
+    door, pwm, changes = _door()
+    door.open()
+    assert door.wait_idle(1.0)
+    before = len(pwm.history)
+
+    door.close()
+    _wait_for(lambda: door.state == CLOSING)
+    assert door.open()
+    assert door.wait_idle(1.0) and door.state == OPEN
+
+    assert door.reversed == 1
+    # reversed straight from the closing motion, without releasing the servo
+    assert [d for _, d in pwm.history[before:]] == [CLOSED_DUTY, OPEN_DUTY, 0.0]
+    assert changes[-3:] == [(OPEN, CLOSING), (CLOSING, OPENING), (OPENING, OPEN)]
+    t_reverse, t_release = pwm.history[-2][0], pwm.history[-1][0]
+    assert t_release - t_reverse >= MOTION_S
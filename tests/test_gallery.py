@@ -0,0 +1,20 @@
+import numpy as np
+
+from gallery import GalleryIndex
+
+
+def test_add_to_empty_gallery():
+    gallery = GalleryIndex()
+    vec = np.arange(1, 513, dtype=np.float32)
+    vec /= np.linalg.norm(vec)
+    gallery.add("alice", vec, meta={"id": 7})
+
+    assert len(gallery) == 1
+    assert gallery.dim == 512
+    name, sim = gallery.snapshot().match(vec)
+    assert name == "alice"
+    assert abs(sim - 1.0) < 1e-5
+
+    gallery.add("bob", -vec)
+    assert len(gallery) == 2
+    assert gallery.snapshot().match(-vec)[0] == "bob"
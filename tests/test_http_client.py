@@ -0,0 +1,33 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_client import HttpClient
+from metrics import METRICS
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(503 if self.path == "/busy" else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_endpoint_stats_are_exported():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_port}"
+    try:
+        client = HttpClient()
+        client.get(url + "/ok", "export_probe")
+        client.get(url + "/busy", "export_probe")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    text = METRICS.render()
+    assert 'facedoor_http_requests_total{endpoint="export_probe"} 2' in text
+    assert 'facedoor_http_request_errors_total{endpoint="export_probe"} 1' in text
+    assert 'facedoor_http_request_seconds_count{endpoint="export_probe"} 2' in text
@@ -0,0 +1,31 @@
+from metrics import Metrics
+
+
+def test_render_names_families_like_their_samples():
+    metrics = Metrics()
+    metrics.describe("frames_dropped", "Frames not processed, by reason")
+    metrics.inc("frames_dropped", reason="static")
+    metrics.inc("frames_dropped", 2, reason="stale")
+    dropped = [0]
+    metrics.counter_fn("queue_dropped", lambda: dropped[0], queue="embed")
+    metrics.gauge("queue_depth", lambda: 3, queue="embed")
+    metrics.observe("stage_latency_seconds", 0.01, stage="detect")
+    dropped[0] = 5
+
+    text = metrics.render()
+    assert text == "\n".join([
+        "# HELP facedoor_frames_dropped_total Frames not processed, by reason",
+        "# TYPE facedoor_frames_dropped_total counter",
+        'facedoor_frames_dropped_total{reason="stale"} 2',
+        'facedoor_frames_dropped_total{reason="static"} 1',
+        "# TYPE facedoor_queue_dropped_total counter",
+        'facedoor_queue_dropped_total{queue="embed"} 5',
+        "# TYPE facedoor_queue_depth gauge",
+        'facedoor_queue_depth{queue="embed"} 3',
+        "# TYPE facedoor_stage_latency_seconds summary",
+        'facedoor_stage_latency_seconds{quantile="0.5",stage="detect"} 0.010000',
+        'facedoor_stage_latency_seconds{quantile="0.95",stage="detect"} 0.010000',
+        'facedoor_stage_latency_seconds{quantile="0.99",stage="detect"} 0.010000',
+        'facedoor_stage_latency_seconds_count{stage="detect"} 1',
+        'facedoor_stage_latency_seconds_sum{stage="detect"} 0.010000',
+    ]) + "\n"
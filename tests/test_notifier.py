@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import notifier
+from notifier import NotifierOutbox
+
+
+class StandInServer:
+    """Local HTTP server answering POSTs with queued status codes (then 200)."""
+
+    def __init__(self):
+        self.received = []        # (monotonic time, path, JSON body, status sent)
+        self.statuses = []
+        self.down = False
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status = 503 if server.down else (server.statuses.pop(0) if server.statuses else 200)
+                server.received.append((time.monotonic(), self.path, body, status))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def delivered(self, path=None):
+        return [body for _, p, body, status in self.received
+                if status == 200 and (path is None or p == path)]
+
+
+@pytest.fixture
+def server():
+    srv = StandInServer()
+    yield srv
+    srv.httpd.shutdown()
+    srv.httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(notifier, "NOTIFY_RETRY_BASE_S", 0.05)
+    monkeypatch.setattr(notifier, "NOTIFY_RETRY_MAX_S", 0.2)
+
+
+def _wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_status_updates_are_coalesced(server, tmp_path):
+    outbox = NotifierOutbox(str(tmp_path / "spool.jsonl"))
+    for status in ("OPEN", "CLOSED", "OPEN"):
+        outbox.post("door_status", server.url + "/status", {"status": status})
+    outbox.post("unknown_face", server.url + "/anon", {"name": "Unknown Person"})
+    outbox.start()
+
+    assert outbox.flush(5)
+    assert server.delivered("/status") == [{"status": "OPEN"}]
+    assert server.delivered("/anon") == [{"name": "Unknown Person"}]
+    assert outbox.coalesced == 2 and outbox.sent == 2
+
+
+def test_retries_with_backoff_on_server_errors(server, tmp_path):
+    server.statuses = [503, 500]
+    outbox = NotifierOutbox(str(tmp_path / "spool.jsonl"))
+    outbox.start()
+    outbox.post("unknown_face", server.url + "/anon", build=lambda: {"name": "Unknown Person"})
+
+    assert outbox.flush(5)
+    times = [t for t, *_ in server.received]
+    assert [status for *_, status in server.received] == [503, 500, 200]
+    assert server.delivered() == [{"name": "Unknown Person"}]
+    assert outbox.retries == 2
+    # the delay doubles after each failure
+    assert times[1] - times[0] >= 0.05
+    assert times[2] - times[1] >= 0.1
+
+
+def test_spool_is_replayed_after_a_restart(server, tmp_path, monkeypatch):
+    spool = str(tmp_path / "spool.jsonl")
+    server.down = True
+    # the first process fails once, spools, then backs off for longer than the test
+    monkeypatch.setattr(notifier, "NOTIFY_RETRY_BASE_S", 60.0)
+    monkeypatch.setattr(notifier, "NOTIFY_RETRY_MAX_S", 60.0)
+    first = NotifierOutbox(spool)
+    first.post("door_status", server.url + "/status", {"status": "OPEN"})
+    first.post("unknown_face", server.url + "/anon", {"name": "Unknown Person"})
+    first.start()
+    _wait_for(lambda: first.retries == 1)
+    with open(spool, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+
+    # restart against a server that is back up
+    monkeypatch.setattr(notifier, "NOTIFY_RETRY_BASE_S", 0.05)
+    monkeypatch.setattr(notifier, "NOTIFY_RETRY_MAX_S", 0.2)
+    server.down = False
+    second = NotifierOutbox(spool)
+    assert second.pending() == 2
+    second.start()
+    assert second.flush(5)
+    assert server.delivered("/status") == [{"status": "OPEN"}]
+    assert server.delivered("/anon") == [{"name": "Unknown Person"}]
+
+    # everything was acked and compacted away: a third start has nothing to replay
+    _wait_for(lambda: os.path.getsize(spool) == 0)
+    assert NotifierOutbox(spool).pending() == 0
+
+
+def test_spool_is_compacted_only_after_it_was_written(server, tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    spool.touch()
+    inode = spool.stat().st_ino
+    outbox = NotifierOutbox(str(spool))
+    outbox.start()
+
+    # clean deliveries never touch the spool
+    for status in ("OPEN", "CLOSED"):
+        outbox.post("door_status", server.url + "/status", {"status": status})
+        assert outbox.flush(5)
+    assert spool.stat().st_ino == inode and spool.stat().st_size == 0
+
+    # a failed delivery spools the message; draining rewrites the spool empty
+    server.statuses = [503]
+    outbox.post("door_status", server.url + "/status", {"status": "OPEN"})
+    assert outbox.flush(5)
+    assert server.delivered("/status")[-1] == {"status": "OPEN"}
+    _wait_for(lambda: spool.stat().st_ino != inode)
+    assert spool.stat().st_size == 0
@@ -0,0 +1,23 @@
+import os
+import warnings
+
+import numpy as np
+
+import replay_models
+from config import ZOO_URL, FACE_DET_MODEL
+from replay_models import ReplayModel
+
+ZOO_DIR = os.path.join(os.path.dirname(replay_models.__file__), ZOO_URL)
+
+
+def test_synthetic_detections_decode_to_well_formed_boxes():
+    model = ReplayModel(FACE_DET_MODEL, ZOO_DIR)
+    image = np.zeros((640, 640, 3), np.uint8)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")   # no division by zero in NMS
+        for _ in range(8):
+            res = model(image).results[0]
+            boxes = res["boxes"]
+            assert len(boxes) == 2
+            assert (boxes[:, 2] > boxes[:, 0]).all() and (boxes[:, 3] > boxes[:, 1]).all()
+            assert np.isfinite(res["scores"]).all() and np.isfinite(res["landmarks"]).all()
@@ -0,0 +1,62 @@
+import queue
+import time
+
+from config import ULTRASONIC_TRIG_PIN, ULTRASONIC_ECHO_PIN
+from fake_gpio import FakeGPIO
+from ultrasonic import EchoTimer, UltrasonicThread, SPEED_OF_SOUND_CM_S
+
+# float rounding of the distance <-> width conversion
+TOLERANCE_S = 1e-6
+
+
+def _width(distance_cm):
+    return 2 * distance_cm / SPEED_OF_SOUND_CM_S
+
+
+def test_measures_replayed_echo_widths():
+    gpio = FakeGPIO()
+    widths = [0.003, 0.010, 0.0015]
+    gpio.replay_echo(ULTRASONIC_TRIG_PIN, ULTRASONIC_ECHO_PIN, widths)
+    sensor = UltrasonicThread(queue.Queue(), gpio=gpio, mode="edge")
+
+    for width in widths:
+        dist = sensor.measure_distance()
+        assert dist is not None
+        assert abs(_width(dist) - width) < TOLERANCE_S
+
+
+def test_late_callbacks_without_timestamps_are_rejected():
+    gpio = FakeGPIO(edge_timestamps=False)
+    gpio.replay_echo(ULTRASONIC_TRIG_PIN, ULTRASONIC_ECHO_PIN, [0.005])
+    sensor = UltrasonicThread(queue.Queue(), gpio=gpio, mode="edge")
+
+    # a slow callback on another pin holds up the callback thread, so the
+    # echo edges are dispatched long after the pulse is over
+    gpio.setup([5], gpio.IN)
+    gpio.add_event_detect(5, gpio.RISING, callback=lambda pin: time.sleep(0.02))
+    gpio.set_input(5, gpio.HIGH)
+    assert sensor.measure_distance() is None
+    assert sensor._echo.late_readings == 1
+
+
+def test_edges_outside_the_measurement_are_ignored():
+    gpio = FakeGPIO()
+    gpio.setup([ULTRASONIC_ECHO_PIN], gpio.IN)
+    timer = EchoTimer(gpio, ULTRASONIC_ECHO_PIN)
+    gpio.add_event_detect(ULTRASONIC_ECHO_PIN, gpio.BOTH, callback=timer.on_edge)
+
+    # captured before arm(): an earlier measurement's echo
+    stale = time.monotonic_ns() - 10_000_000
+    timer.arm()
+    gpio.set_input(ULTRASONIC_ECHO_PIN, gpio.HIGH, stale)
+    gpio.set_input(ULTRASONIC_ECHO_PIN, gpio.LOW, stale + 1_000_000)
+
+    rise = time.monotonic_ns()
+    gpio.set_input(ULTRASONIC_ECHO_PIN, gpio.HIGH, rise)
+    gpio.set_input(ULTRASONIC_ECHO_PIN, gpio.LOW, rise + 4_000_000)
+    # after the pulse, until the next arm()
+    gpio.set_input(ULTRASONIC_ECHO_PIN, gpio.HIGH, rise + 5_000_000)
+    gpio.set_input(ULTRASONIC_ECHO_PIN, gpio.LOW, rise + 6_000_000)
+    assert timer.wait(1.0) == 0.004
+    time.sleep(0.05)
+    assert timer.wait(0.1) == 0.004
@@ -0,0 +1,14 @@
+import numpy as np
+
+from utils import detections_to_arrays
+
+
+def test_detections_without_five_landmarks_are_dropped():
+    lm = lambda x, y: {"landmark": [x, y]}
+    results = [
+        {"bbox": [10, 10, 50, 50], "score": 0.9, "landmarks": [lm(20, 20)] * 5},
+        {"bbox": [60, 60, 90, 90], "score": 0.8, "landmarks": [lm(70, 70)] * 3},
+    ]
+    boxes, scores, lms = detections_to_arrays(results)
+    assert boxes.shape == (1, 4) and lms.shape == (1, 5, 2)
+    np.testing.assert_allclose(scores, [0.9])